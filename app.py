@@ -7,40 +7,170 @@ from dataclasses import dataclass
 import json
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
 from flask_moment import Moment
-from sqlalchemy import select, func
+from sqlalchemy import select, func, or_, cast
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
 from forms import *
 from datetime import datetime
-from models import db, setup_db, Venue, Artist, Shows
+from functools import lru_cache
+from itertools import groupby
+from zoneinfo import ZoneInfo
+from config import config_for
+from models import db, setup_db, Venue, Artist, Shows, ShowSeries, DEFAULT_SHOW_MINUTES
+from pagination import paginate_request
+from genres import request_genre_filter, filter_by_genres, facet_query, genre_facets, genre_link_args
+from search_index import SuggestIndex
+from matchmaking import CandidateMatrix, suggestions
+from bookings import lock_bookings, find_conflicts, describe_conflict
+from series import occurrences, describe_series, create_series, collapse_series, MAX_SERIES_SHOWS
+from cache import make_cache
+from exporter import export_query, WRITERS
+from commands import spotlight_cli
+from sql_stats import init_sql_stats
+from metrics import init_metrics
+from profiling import init_profiling
+from assets import init_assets
+from conditional import (init_conditional, conditional, page_version, venue_page_validators,
+                         artist_page_validators, table_validators)
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
-def create_app(config_filename):
+def create_app(environment=None):
+  # environment is development, testing or production, SPOTLIGHT_ENV by default
   app = Flask(__name__)
-  setup_db(app, config_filename)
+  setup_db(app, config_for(environment))
+  if not app.config['SECRET_KEY']:
+    raise RuntimeError('set SECRET_KEY in the environment')
   migrate = Migrate(app, db)
+  init_sql_stats(app)
+  init_metrics(app)
+  init_profiling(app)
+  init_assets(app)
+  init_conditional(app)
+  app.cli.add_command(spotlight_cli)
   return app
 
-app = create_app('config')
+app = create_app()
+# assembled venue and artist page data, see page_timeout and the *_page_keys helpers
+detail_cache = make_cache(app.config)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  # parsing the babel pattern and resolving the locale cost more than applying them,
+  # and both only depend on (format, locale)
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+@lru_cache(maxsize=16)
+def display_timezone(name):
+  return ZoneInfo(name) if name else None
+
+def format_datetime(value, format='medium', locale='en'):
+  # takes datetime objects as they come from the database, strings are still accepted
+  if not isinstance(value, datetime):
+    try:
+      value = datetime.fromisoformat(value)
+    except ValueError:
+      value = dateutil.parser.parse(value)
+  # with DISPLAY_TIMEZONE set, values are shown in that zone. start times are stored naive
+  # in the server's local time (they are compared with datetime.now()), which astimezone
+  # assumes for naive values
+  timezone = display_timezone(app.config.get('DISPLAY_TIMEZONE'))
+  if timezone is not None:
+    value = value.astimezone(timezone)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def search_query(model, keyword):
+  # matches the keyword case-insensitively against the name, either as a substring or as a
+  # fuzzy trigram match, and against "city, state". both are served by the pg_trgm GIN
+  # indexes on the model. distance (1 - similarity) of the closer of the two ranks results.
+  location = model.city + ', ' + model.state
+  pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+  matches = db.session.query(model.id, model.name).filter(or_(
+    model.name.ilike(pattern),
+    model.name.op('%')(keyword),
+    location.ilike(pattern)
+  ))
+  # pg_trgm distances are real, cast to double so the value survives a round trip through
+  # a page cursor exactly
+  distance = cast(func.least(
+    model.name.op('<->')(keyword),
+    location.op('<->')(keyword)
+  ), db.Float).label('distance')
+  return matches, distance
+
+def search_listing_query(model, keyword):
+  # the matches, the query for a page of results ranked by distance, and its sort key
+  matches, distance = search_query(model, keyword)
+  query = matches.add_columns(distance, model.upcoming_shows_count.label('num_upcoming_shows'))
+  return matches, query, [distance, model.id]
+
+def search_results(count, page):
+  return {
+    'count': count,
+    'data': [{'id': row.id, 'name': row.name, 'num_upcoming_shows': row.num_upcoming_shows} for row in page]
+  }
+
+def load_suggestions():
+  for venue in db.session.query(Venue.id, Venue.name).yield_per(10000):
+    yield 'venue', venue.id, venue.name
+  for artist in db.session.query(Artist.id, Artist.name).yield_per(10000):
+    yield 'artist', artist.id, artist.name
+
+# typeahead index over venue and artist names, kept current by the create, edit and
+# delete handlers below
+suggest_index = SuggestIndex(load_suggestions)
+
+# the artists seeking venues and the venues seeking talent, ranked in bulk for the
+# suggested-artists and suggested-venues pages
+artist_candidates = CandidateMatrix(Artist, Artist.seeking_venue)
+venue_candidates = CandidateMatrix(Venue, Venue.seeking_talent)
+
+def suggestion_limit():
+  return max(1, min(request.args.get('limit', 10, type=int), 50))
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def page_timeout(data):
+  # shows are split into past and upcoming when the page data is built, so a cached
+  # page must not outlive the start of its next upcoming show
+  timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+  if data['upcoming_shows']:
+    next_start = min(datetime.fromisoformat(show['start_time']) for show in data['upcoming_shows'])
+    timeout = min(timeout, max(1, (next_start - datetime.now()).total_seconds()))
+  return timeout
+
+def venue_page_keys(venue_id):
+  # a venue page, plus the pages of the artists who played there since they list the venue
+  artist_ids = db.session.query(Shows.artist_id).filter(Shows.venue_id == venue_id).distinct()
+  return ['venue:%d' % venue_id] + ['artist:%d' % artist_id for artist_id, in artist_ids]
+
+def artist_page_keys(artist_id):
+  # an artist page, plus the pages of the venues the artist played since they list the artist
+  venue_ids = db.session.query(Shows.venue_id).filter(Shows.artist_id == artist_id).distinct()
+  return ['artist:%d' % artist_id] + ['venue:%d' % venue_id for venue_id, in venue_ids]
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -50,29 +180,67 @@ def index():
   return render_template('pages/home.html')
 
 
+#  Search Suggestions
+#  ----------------------------------------------------------------
+
+@app.route('/search/suggest')
+def search_suggest():
+  # answers from the in-memory index, no database round trip once it is built
+  query = request.args.get('q', '')
+  limit = min(request.args.get('limit', 10, type=int), 50)
+  suggest_index.ensure_fresh(app)
+  results = suggest_index.suggest(query, max(limit, 1))
+  for result in results:
+    result['url'] = url_for('show_' + result['type'], **{result['type'] + '_id': result['id']})
+  return jsonify({'query': query, 'results': results})
+
+#  Cache Stats
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(detail_cache.stats())
+
 #  Venues
 #  ----------------------------------------------------------------
 
+# the read handlers are split into a query builder and a function that turns the rows
+# into template data, so the async read path in asgi.py can run the same queries
+
+def series_data(row):
+  # the recurring series a show row belongs to, for its tile, collapse_series adds how
+  # many shows of the page the tile stands for
+  if row.series_id is None:
+    return None
+  return {'description': describe_series(row.series_frequency, row.series_interval, row.series_first_start_time)}
+
+def venues_query(genres=(), match='any'):
+  # the page is ordered by (city, state) so that it can be grouped into areas as it is
+  # read, num_upcoming_shows comes from the counter maintained on each venue
+  query = db.session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state,
+    Venue.upcoming_shows_count.label('num_upcoming_shows')
+  )
+  return filter_by_genres(query, Venue, genres, match), [Venue.city, Venue.state, Venue.name, Venue.id]
+
+def venue_areas(page):
+  data = []
+  for (city, state), area_venues in groupby(page, key=lambda venue: (venue.city, venue.state)):
+    data.append({
+      'city': city,
+      'state': state,
+      'venues': [{'id': venue.id, 'name': venue.name, 'num_upcoming_shows': venue.num_upcoming_shows} for venue in area_venues]
+    })
+  return data
+
 @app.route('/venues')
+@conditional(table_validators('Venue'))
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  this_city = -1
-  venues = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name).order_by(Venue.city).all()
-  print('all venues:', venues)
-  for venue in venues:
-    num_up_shows = db.session.query(Shows).filter(Shows.venue_id==venue.id, Shows.start_time > datetime.today()).count()
-    venueData = {'id': venue.id, 'name': venue.name, 'num_upcoming_shows': num_up_shows}
-    if this_city >= 0 and venue.city == data[this_city]['city']:
-      print(data[this_city])
-      data[this_city]['venues'].append(venueData)
-    else:
-      this_city += 1
-      data.append({'city': venue.city, 'state': venue.state, 'venues': list()})
-      data[this_city]['venues'].append(venueData)
-  # print('returning data:', data)
-  return render_template('pages/venues.html', areas=data);
+  genres, match = request_genre_filter()
+  query, columns = venues_query(genres, match)
+  page = paginate_request(query, columns, **genre_link_args(genres, match))
+  facets = genre_facets(facet_query(Venue, genres, match).all(), genres, match)
+  return render_template('pages/venues.html', areas=venue_areas(page), page=page, facets=facets)
 
   ## mock data 
   # data=[{
@@ -100,25 +268,16 @@ def venues():
 #  Search Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-  # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  response = {}
-  keyword = request.form.get('search_term')
-    
-  response['count'] = len(venues)
-  response['data'] = []
-  for venue in venues:
-    venueData = {}
-    venueData['id'] = venue.id
-    venueData['name'] = venue.name
-    num_up_shows = db.session.query(Shows).filter(Shows.venue_id==venue.id, Shows.start_time > datetime.today()).count()
-    venueData['num_upcoming_shows'] = num_up_shows
-    print(venueData)
-    response['data'].append(venueData)
-  return render_template('pages/search_venues.html', results=response, search_term=keyword)
+  # the form posts the first search, the page links come back as GET requests
+  keyword = request.values.get('search_term', '')
+  matches, query, columns = search_listing_query(Venue, keyword)
+  page = paginate_request(query, columns, search_term=keyword)
+  response = search_results(matches.count(), page)
+  return render_template('pages/search_venues.html', results=response, search_term=keyword, page=page)
 
   # # mock data
   # response={
@@ -133,13 +292,27 @@ def search_venues():
 #  Show Venue by id
 #  ----------------------------------------------------------------
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  
-  venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
-  print('this venue:', venue)
+def venue_page_query(venue_id):
+  # one round trip: the venue is outer joined to its shows and their artists, so a venue
+  # without shows still comes back as a single row with empty show columns
+  return db.session.query(
+    Venue,
+    Shows.start_time,
+    Artist.id.label('artist_id'),
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link'),
+    Shows.series_id,
+    ShowSeries.frequency.label('series_frequency'),
+    ShowSeries.interval.label('series_interval'),
+    ShowSeries.first_start_time.label('series_first_start_time')
+  ).outerjoin(Shows, Shows.venue_id == Venue.id).outerjoin(Artist, Artist.id == Shows.artist_id) \
+    .outerjoin(ShowSeries, ShowSeries.id == Shows.series_id) \
+    .filter(Venue.id == venue_id).order_by(Shows.start_time)
+
+def venue_page_from_rows(rows):
+  if not rows:
+    return None
+  venue = rows[0].Venue
   data = {
     'id': venue.id,
     'name': venue.name,
@@ -156,32 +329,38 @@ def show_venue(venue_id):
   }
   data['past_shows'] = list()
   data['upcoming_shows'] = list()
-  
-  # make sure to select both Shows and Artist in the query, so that the query results can contain columns from both tables
-  past_shows_query = db.session.query(Shows, Artist).join(Artist).filter(Shows.venue_id == venue_id).filter(Shows.start_time < datetime.now()).all()
-  upcoming_shows_query = db.session.query(Shows, Artist).join(Artist).filter(Shows.venue_id == venue_id).filter(Shows.start_time >= datetime.now()).all()
-  
-  for show, artist in past_shows_query:
-    performance = {
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': str(show.start_time)
-    }
-    data['past_shows'].append(performance)
-    
-  for show, artist in upcoming_shows_query:
+
+  # split into past and upcoming in the same pass that builds the show dicts
+  now = datetime.now()
+  for row in rows:
+    if row.start_time is None:
+      continue
     performance = {
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image_link': artist.image_link,
-      'start_time': str(show.start_time)
+      'artist_id': row.artist_id,
+      'artist_name': row.artist_name,
+      'artist_image_link': row.artist_image_link,
+      'start_time': str(row.start_time),
+      'series_id': row.series_id,
+      'series': series_data(row)
     }
-    data['upcoming_shows'].append(performance)
-  
+    data['past_shows' if row.start_time < now else 'upcoming_shows'].append(performance)
+
   data['past_shows_count'] = len(data['past_shows'])
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
-  
+  data['past_shows'] = collapse_series(data['past_shows'])
+  data['upcoming_shows'] = collapse_series(data['upcoming_shows'])
+  return data
+
+def venue_page_data(venue_id):
+  return venue_page_from_rows(venue_page_query(venue_id).all())
+
+@app.route('/venues/<int:venue_id>')
+@conditional(venue_page_validators)
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  data = detail_cache.get_or_set('venue:%d' % venue_id, lambda: venue_page_data(venue_id), page_timeout, page_version())
+  if data is None:
+    abort(404)
   return render_template('pages/show_venue.html', venue=data)
   ## mock data
   # data1={
@@ -208,6 +387,17 @@ def show_venue(venue_id):
   #   "upcoming_shows_count": 0,
   # }
 
+@app.route('/venues/<int:venue_id>/suggested-artists')
+def suggested_artists(venue_id):
+  # artists seeking a venue, ranked by shared genres, location and past shows here
+  venue = Venue.query.get_or_404(venue_id)
+  shared_shows = dict(db.session.query(Shows.artist_id, func.count())
+                      .filter(Shows.venue_id == venue_id, Shows.start_time < datetime.now())
+                      .group_by(Shows.artist_id))
+  artist_candidates.ensure_fresh(app)
+  results = suggestions(artist_candidates, venue, shared_shows, suggestion_limit())
+  return render_template('pages/suggestions.html', target=venue, kind='artist', results=results)
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -239,7 +429,10 @@ def create_venue_submission():
         seeking_description = form.seeking_description.data
       )
       db.session.add(newVenue)
+      db.session.flush()
+      venue_id = newVenue.id
       db.session.commit()
+      suggest_index.add('venue', venue_id, form.name.data)
     except:
       error = True
       db.session.rollback()
@@ -255,7 +448,6 @@ def create_venue_submission():
   else:
     errors = form.errors
     fields = errors.keys()
-    print(fields)
     for field in fields:
       message = errors.get(field)
       flash(field + ' does not meet requirement: ' + str(message))
@@ -301,9 +493,12 @@ def edit_venue_submission(venue_id):
     thisVenue.website = form.website_link.data
     thisVenue.seeking_talent = form.seeking_talent.data
     thisVenue.seeking_description = form.seeking_description.data
+    stale_pages = venue_page_keys(venue_id)
     db.session.commit()
+    suggest_index.add('venue', venue_id, form.name.data)
+    detail_cache.delete(*stale_pages)
   except Exception as e:
-    print(e)
+    app.logger.exception(e)
     db.session.rollback()
     error = True
   finally:
@@ -323,11 +518,13 @@ def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
   error = False
-  print(request.data)
   try:
     venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+    stale_pages = venue_page_keys(venue.id)
     db.session.delete(venue)
     db.session.commit()
+    suggest_index.remove('venue', int(venue_id))
+    detail_cache.delete(*stale_pages)
   except:
     db.session.rollback()
     error = True
@@ -343,16 +540,21 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
+def artists_query(genres=(), match='any'):
+  query = db.session.query(Artist.id, Artist.name)
+  return filter_by_genres(query, Artist, genres, match), [Artist.name, Artist.id]
+
+def artist_listing(page):
+  return [{'id': artist.id, 'name': artist.name} for artist in page]
+
 @app.route('/artists')
+@conditional(table_validators('Artist'))
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = []
-  artists = db.session.query(Artist).all()
-  print('all artists:', artists)
-  for artist in artists:
-    artistData = {'id': artist.id, 'name': artist.name}
-    data.append(artistData)
-  return render_template('pages/artists.html', artists=data)
+  genres, match = request_genre_filter()
+  query, columns = artists_query(genres, match)
+  page = paginate_request(query, columns, **genre_link_args(genres, match))
+  facets = genre_facets(facet_query(Artist, genres, match).all(), genres, match)
+  return render_template('pages/artists.html', artists=artist_listing(page), page=page, facets=facets)
   ## mock data    
   # data=[{
   #   "id": 4,
@@ -368,25 +570,16 @@ def artists():
 #  Search Artists
 #  ----------------------------------------------------------------
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  response = {}
-  keyword = request.form.get('search_term')
-  artists = db.session.query(Artist).filter(Artist.name.ilike('%'+keyword+'%')).all()
-  response['count'] = len(artists)
-  response['data'] = []
-  for artist in artists:
-    artistData = {}
-    artistData['id'] = artist.id
-    artistData['name'] = artist.name
-    num_up_shows = db.session.query(Shows).filter(Shows.artist_id==artist.id, Shows.start_time > datetime.today()).count()
-    artistData['num_upcoming_shows'] = num_up_shows
-    print('matching artist', artistData)
-    response['data'].append(artistData)
-  return render_template('pages/search_artists.html', results=response, search_term=keyword)
+  # the form posts the first search, the page links come back as GET requests
+  keyword = request.values.get('search_term', '')
+  matches, query, columns = search_listing_query(Artist, keyword)
+  page = paginate_request(query, columns, search_term=keyword)
+  response = search_results(matches.count(), page)
+  return render_template('pages/search_artists.html', results=response, search_term=keyword, page=page)
   ## mock data
   # response={
   #   "count": 1,
@@ -400,12 +593,27 @@ def search_artists():
 #  Show Artists by id
 #  ----------------------------------------------------------------
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  artist = db.session.query(Artist).filter(Artist.id == artist_id).first()
-  print('this artist:', artist)
+def artist_page_query(artist_id):
+  # one round trip: the artist is outer joined to their shows and those venues, so an
+  # artist without shows still comes back as a single row with empty show columns
+  return db.session.query(
+    Artist,
+    Shows.start_time,
+    Venue.id.label('venue_id'),
+    Venue.name.label('venue_name'),
+    Venue.image_link.label('venue_image_link'),
+    Shows.series_id,
+    ShowSeries.frequency.label('series_frequency'),
+    ShowSeries.interval.label('series_interval'),
+    ShowSeries.first_start_time.label('series_first_start_time')
+  ).outerjoin(Shows, Shows.artist_id == Artist.id).outerjoin(Venue, Venue.id == Shows.venue_id) \
+    .outerjoin(ShowSeries, ShowSeries.id == Shows.series_id) \
+    .filter(Artist.id == artist_id).order_by(Shows.start_time)
+
+def artist_page_from_rows(rows):
+  if not rows:
+    return None
+  artist = rows[0].Artist
   data = {
     'id': artist.id,
     'name': artist.name,
@@ -421,38 +629,38 @@ def show_artist(artist_id):
     }
   data['past_shows'] = list()
   data['upcoming_shows'] = list()
-  
-  # past_shows and upcoming_shows are row objects as list of tuples
-  past_shows_query = db.session.query(Shows, Venue).join(Venue).filter(Shows.artist_id == artist_id).filter(Shows.start_time < datetime.now()).all()
-  upcoming_shows_query = db.session.query(Shows, Venue).join(Venue).filter(Shows.artist_id == artist_id).filter(Shows.start_time >= datetime.now()).all()
-  
-  # both tables/entities need to be selected in the query in order to return columns from both tables, see below query objects
-  # print(db.session.query(Shows, Venue))
-  # print(db.session.query(Shows, Venue).join(Venue))
-  # print(db.session.query(Shows))
-  # print(db.session.query(Shows).join(Venue))
-  
-  for show, venue in past_shows_query:
-    performance = {
-      'venue_id': venue.id,
-      'venue_name': venue.name,
-      'venue_image_link': venue.image_link,
-      'start_time': str(show.start_time)
-    }
-    data['past_shows'].append(performance)
-  
-  for show, venue in upcoming_shows_query:
+
+  # split into past and upcoming in the same pass that builds the show dicts
+  now = datetime.now()
+  for row in rows:
+    if row.start_time is None:
+      continue
     performance = {
-      'venue_id': venue.id,
-      'venue_name': venue.name,
-      'venue_image_link': venue.image_link,
-      'start_time': str(show.start_time)
+      'venue_id': row.venue_id,
+      'venue_name': row.venue_name,
+      'venue_image_link': row.venue_image_link,
+      'start_time': str(row.start_time),
+      'series_id': row.series_id,
+      'series': series_data(row)
     }
-    data['upcoming_shows'].append(performance)
-    
+    data['past_shows' if row.start_time < now else 'upcoming_shows'].append(performance)
+
   data['past_shows_count'] = len(data['past_shows'])
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
-  # print('all artsit data:', data)
+  data['past_shows'] = collapse_series(data['past_shows'])
+  data['upcoming_shows'] = collapse_series(data['upcoming_shows'])
+  return data
+
+def artist_page_data(artist_id):
+  return artist_page_from_rows(artist_page_query(artist_id).all())
+
+@app.route('/artists/<int:artist_id>')
+@conditional(artist_page_validators)
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  data = detail_cache.get_or_set('artist:%d' % artist_id, lambda: artist_page_data(artist_id), page_timeout, page_version())
+  if data is None:
+    abort(404)
   return render_template('pages/show_artist.html', artist=data)
 
   ## mock data
@@ -478,6 +686,17 @@ def show_artist(artist_id):
   #   "past_shows_count": 1,
   #   "upcoming_shows_count": 0,
   # }
+
+@app.route('/artists/<int:artist_id>/suggested-venues')
+def suggested_venues(artist_id):
+  # venues seeking talent, ranked by shared genres, location and past shows of the artist
+  artist = Artist.query.get_or_404(artist_id)
+  shared_shows = dict(db.session.query(Shows.venue_id, func.count())
+                      .filter(Shows.artist_id == artist_id, Shows.start_time < datetime.now())
+                      .group_by(Shows.venue_id))
+  venue_candidates.ensure_fresh(app)
+  results = suggestions(venue_candidates, artist, shared_shows, suggestion_limit())
+  return render_template('pages/suggestions.html', target=artist, kind='venue', results=results)
  
 #  Create Artist
 #  ----------------------------------------------------------------
@@ -509,9 +728,12 @@ def create_artist_submission():
         seeking_description = form.seeking_description.data
       )
       db.session.add(newArtist)
+      db.session.flush()
+      artist_id = newArtist.id
       db.session.commit()
+      suggest_index.add('artist', artist_id, form.name.data)
     except Exception as e:
-      print(e)
+      app.logger.exception(e)
       db.session.rollback()
       error = True
     finally:
@@ -526,7 +748,6 @@ def create_artist_submission():
   else:
     errors = form.errors
     fields = errors.keys()
-    print(fields)
     for field in fields:
       message = errors.get(field)
       flash(field + ' does not meet requirement: ' + str(message))
@@ -559,7 +780,6 @@ def edit_artist_submission(artist_id):
   error = False
   try:
     thisArtist = db.session.query(Artist).filter(Artist.id == artist_id).first()
-    print(thisArtist)
     thisArtist.name = form.name.data
     thisArtist.city = form.city.data
     thisArtist.state = form.state.data
@@ -570,9 +790,12 @@ def edit_artist_submission(artist_id):
     thisArtist.website = form.website_link.data
     thisArtist.seeking_venue = form.seeking_venue.data
     thisArtist.seeking_description = form.seeking_description.data
+    stale_pages = artist_page_keys(artist_id)
     db.session.commit()
+    suggest_index.add('artist', artist_id, form.name.data)
+    detail_cache.delete(*stale_pages)
   except Exception as e:
-    print(e)
+    app.logger.exception(e)
     db.session.rollback()
     error = True
   finally:
@@ -592,11 +815,13 @@ def delete_artist(artist_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
   error = False
-  print(request.data)
   try:
     artist = db.session.query(Artist).filter(Artist.id == artist_id).first()
+    stale_pages = artist_page_keys(artist.id)
     db.session.delete(artist)
     db.session.commit()
+    suggest_index.remove('artist', int(artist_id))
+    detail_cache.delete(*stale_pages)
   except:
     db.session.rollback()
     error = True
@@ -613,28 +838,52 @@ def delete_artist(artist_id):
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
-def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
+def shows_query():
+  query = db.session.query(
+    Shows.id,
+    Shows.venue_id,
+    Shows.artist_id,
+    Shows.start_time,
+    Venue.name.label('venue_name'),
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link'),
+    Shows.series_id,
+    ShowSeries.frequency.label('series_frequency'),
+    ShowSeries.interval.label('series_interval'),
+    ShowSeries.first_start_time.label('series_first_start_time'),
+    ShowSeries.last_start_time.label('series_last_start_time'),
+    ShowSeries.count.label('series_count')
+  ).join(Venue, Shows.venue_id == Venue.id).join(Artist, Shows.artist_id == Artist.id) \
+    .outerjoin(ShowSeries, ShowSeries.id == Shows.series_id)
+  # a series is listed once, at its first show
+  query = query.filter(or_(Shows.series_id.is_(None), Shows.start_time == ShowSeries.first_start_time))
+  # start_time alone is not unique, the id breaks ties
+  return query, [Shows.start_time, Shows.id]
+
+def show_listing(page):
   data = []
-  shows = db.session.query(Shows).order_by(Shows.start_time).all()
-  print(shows)
-  
-  for show in shows:
-    venue_name = db.session.query(Venue).get(show.venue_id).name
-    artist_name = db.session.query(Artist).get(show.artist_id).name
-    artist_image = db.session.query(Artist).get(show.artist_id).image_link
+  for show in page:
     showData = {
       'venue_id': show.venue_id,
-      'venue_name': venue_name,
+      'venue_name': show.venue_name,
       'artist_id': show.artist_id,
-      'artist_name': artist_name,
-      'artist_image_link': artist_image,
-      'start_time': str(show.start_time)
+      'artist_name': show.artist_name,
+      'artist_image_link': show.artist_image_link,
+      'start_time': show.start_time,
+      'series': series_data(show)
     }
+    if showData['series']:
+      showData['series'].update(count=show.series_count, last_start_time=show.series_last_start_time)
     data.append(showData)
-  return render_template('pages/shows.html', shows=data)
+  return data
+
+@app.route('/shows')
+@conditional(table_validators('Shows', 'Venue', 'Artist'))
+def shows():
+  # displays list of shows at /shows, one page at a time
+  query, columns = shows_query()
+  page = paginate_request(query, columns)
+  return render_template('pages/shows.html', shows=show_listing(page), page=page)
   
   ## mock data
   # data=[{
@@ -661,28 +910,55 @@ def create_shows():
 
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
-  # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
+  # called to create new shows in the db, upon submitting new show listing form. with
+  # repeat set the form describes a weekly or monthly series, whose shows are checked for
+  # conflicts in one query and inserted in one transaction
   form = ShowForm()
+  if not form.validate_on_submit():
+    for field, message in form.errors.items():
+      flash(field + ' does not meet requirement: ' + str(message))
+    return render_template('forms/new_show.html', form=form)
   error = False
   try:
     venue_id = form.venue_id.data
     artist_id = form.artist_id.data
-    print(venue_id, artist_id)
     host = db.session.query(Venue).get(venue_id)
     performer = db.session.query(Artist).get(artist_id)
-    print(host.name, performer.name)
     if host is not None and performer is not None:  
-      newShow = Shows(start_time = form.start_time.data)
-      newShow.venue = host
-      newShow.artist = performer
-      db.session.add(newShow)
+      duration_minutes = DEFAULT_SHOW_MINUTES if form.duration_minutes.data is None else form.duration_minutes.data
+      if form.repeat.data:
+        start_times = occurrences(form.start_time.data, form.repeat.data, form.repeat_interval.data or 1,
+                                  form.repeat_until.data, form.repeat_count.data)
+        if len(start_times) > MAX_SERIES_SHOWS:
+          flash('A series can have at most {} shows, choose an earlier end date.'.format(MAX_SERIES_SHOWS))
+          return render_template('forms/new_show.html', form=form)
+      else:
+        start_times = [form.start_time.data]
+      proposed = [{'venue_id': host.id, 'artist_id': performer.id, 'start_time': start_time,
+                   'duration_minutes': duration_minutes} for start_time in start_times]
+      lock_bookings(proposed)
+      conflicts = find_conflicts(proposed)
+      if conflicts:
+        db.session.rollback()
+        flash('Show could not be listed: {}.'.format('; '.join(
+          '{:%Y-%m-%d %H:%M}: {}'.format(start_times[conflict['position']], describe_conflict(conflict))
+          if form.repeat.data else describe_conflict(conflict) for conflict in conflicts)))
+        return render_template('forms/new_show.html', form=form)
+      if form.repeat.data:
+        create_series(host.id, performer.id, form.repeat.data, form.repeat_interval.data or 1, start_times, duration_minutes)
+      else:
+        newShow = Shows(start_time = form.start_time.data, duration_minutes = duration_minutes)
+        newShow.venue = host
+        newShow.artist = performer
+        db.session.add(newShow)
+      stale_pages = ['venue:%d' % host.id, 'artist:%d' % performer.id]
       db.session.commit()
+      detail_cache.delete(*stale_pages)
     else:
       flash('An error occurred. Can not find artist ID or venue ID.')
       return render_template('pages/home.html')
   except Exception as e:
-    print(e)
+    app.logger.exception(e)
     error = True
     db.session.rollback()
   finally:
@@ -690,11 +966,27 @@ def create_show_submission():
   if error:
     # # TODO: on unsuccessful db insert, flash an error instead.
     flash('An error occurred. Show could not be listed.')
+  elif form.repeat.data:
+    flash('Series of {} shows was successfully listed!'.format(len(start_times)))
   else:
     # # on successful db insert, flash success
     flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):kind>.<any(csv, ndjson):format>')
+def export(kind, format):
+  # streams a full dump, or with since=<id> the rows added after that id, in constant memory
+  since = request.args.get('since', type=int)
+  if 'since' in request.args and since is None:
+    abort(400)
+  chunks, mimetype = WRITERS[format]
+  response = Response(stream_with_context(chunks(export_query(kind, since))), mimetype=mimetype)
+  response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(kind, format)
+  return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,220 @@
+#----------------------------------------------------------------------------#
+# Async read path.
+#----------------------------------------------------------------------------#
+
+# ASGI entry point, run with e.g. `uvicorn asgi:asgi_app --workers 4`.
+#
+# the listings, the search result pages and the venue and artist pages are served by
+# coroutines that run the same queries as the Flask handlers (built by the *_query
+# functions in app.py) on SQLAlchemy's asyncio engine, so a worker keeps serving other
+# requests while one waits on the database. each of them runs inside a Flask request
+# context built from the ASGI request, so the templates, url_for, the filters, the replica
+# routing and the page cache behave as they do under WSGI. every other request, including
+# all writes and the search form posts, is handed to the WSGI app unchanged. the Flask
+# before/after request hooks (SQL statistics, profiling) do not run for the async pages;
+# they record the request metrics themselves and save the session as Flask saves it.
+
+import contextlib
+from datetime import datetime
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from flask import render_template, request as flask_request, session, g, abort
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+from app import (app, detail_cache, page_timeout, search_listing_query, search_results,
+                 venues_query, venue_areas, venue_page_query, venue_page_from_rows,
+                 artists_query, artist_listing, artist_page_query, artist_page_from_rows,
+                 shows_query, show_listing)
+from models import Venue, Artist, replica_for_request
+from conditional import (has_flashes, set_page_version, page_version, not_modified, add_validators,
+                         detail_validators, listing_validators, venue_page_version_query,
+                         artist_page_version_query, table_version_query)
+from genres import request_genre_filter, facet_query, genre_facets, genre_link_args
+from metrics import start_request, finish_request
+from pagination import page_query, build_page, request_page_args, link_page
+
+#----------------------------------------------------------------------------#
+# Engines.
+#----------------------------------------------------------------------------#
+
+def async_url(url):
+  # the same database through asyncpg
+  return 'postgresql+asyncpg://' + url.split('://', 1)[1]
+
+def async_engine_options(config):
+  # the pool settings of models.engine_options sized by ASYNC_DB_POOL_SIZE and
+  # ASYNC_DB_MAX_OVERFLOW, asyncpg takes the statement timeout as a server setting
+  options = {
+    'pool_size': config['ASYNC_DB_POOL_SIZE'],
+    'max_overflow': config['ASYNC_DB_MAX_OVERFLOW'],
+    'pool_timeout': config['DB_POOL_TIMEOUT'],
+    'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    'pool_recycle': config['DB_POOL_RECYCLE'],
+  }
+  if config.get('DB_STATEMENT_TIMEOUT_MS'):
+    options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}}
+  return options
+
+engines = {}
+
+def engine_for(bind):
+  # the primary for bind None, otherwise the replica bind, created on first use
+  if bind not in engines:
+    url = app.config['SQLALCHEMY_DATABASE_URI'] if bind is None else app.config['SQLALCHEMY_BINDS'][bind]
+    engines[bind] = create_async_engine(async_url(url), **async_engine_options(app.config))
+  return engines[bind]
+
+@contextlib.asynccontextmanager
+async def request_session():
+  # one session for all statements of the current request, from the primary or the replica
+  # the request may read. it checks out one connection at the first statement and returns
+  # it when the request is done
+  async with AsyncSession(engine_for(replica_for_request(app))) as db_session:
+    g.db_session = db_session
+    yield db_session
+
+async def fetch(statement):
+  # the rows of statement, through the request's session
+  return (await g.db_session.execute(statement)).all()
+
+async def paginate_request(query, columns, **link_args):
+  # pagination.paginate_request with the page fetched asynchronously
+  limit, after, before = request_page_args(columns)
+  rows = await fetch(page_query(query, columns, limit, after, before).statement)
+  return link_page(build_page(rows, columns, limit, after, before), **link_args)
+
+async def count(query):
+  rows = await fetch(select(func.count()).select_from(query.statement.subquery()))
+  return rows[0][0]
+
+def conditional(version_query, page_validators):
+  # conditional.conditional for the controllers below, version_query(**path_params)
+  # builds the validators' query and page_validators turns its rows into them
+  def decorator(controller):
+    @wraps(controller)
+    async def wrapper(**path_params):
+      validators = page_validators(await fetch(version_query(**path_params).statement))
+      set_page_version(validators)
+      if has_flashes():
+        return await controller(**path_params)
+      return not_modified(validators) or add_validators(app.make_response(await controller(**path_params)), validators)
+    return wrapper
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+# each controller matches the Flask handler of the same name in app.py
+
+@conditional(lambda: table_version_query('Venue'), listing_validators)
+async def venues():
+  genres, match = request_genre_filter()
+  query, columns = venues_query(genres, match)
+  page = await paginate_request(query, columns, **genre_link_args(genres, match))
+  facets = genre_facets(await fetch(facet_query(Venue, genres, match).statement), genres, match)
+  return render_template('pages/venues.html', areas=venue_areas(page), page=page, facets=facets)
+
+async def search_venues():
+  keyword = flask_request.values.get('search_term', '')
+  matches, query, columns = search_listing_query(Venue, keyword)
+  page = await paginate_request(query, columns, search_term=keyword)
+  response = search_results(await count(matches), page)
+  return render_template('pages/search_venues.html', results=response, search_term=keyword, page=page)
+
+@conditional(lambda venue_id: venue_page_version_query(venue_id, datetime.now()), detail_validators)
+async def show_venue(venue_id):
+  async def build():
+    return venue_page_from_rows(await fetch(venue_page_query(venue_id).statement))
+  data = await detail_cache.get_or_set_async('venue:%d' % venue_id, build, page_timeout, page_version())
+  if data is None:
+    abort(404)
+  return render_template('pages/show_venue.html', venue=data)
+
+@conditional(lambda: table_version_query('Artist'), listing_validators)
+async def artists():
+  genres, match = request_genre_filter()
+  query, columns = artists_query(genres, match)
+  page = await paginate_request(query, columns, **genre_link_args(genres, match))
+  facets = genre_facets(await fetch(facet_query(Artist, genres, match).statement), genres, match)
+  return render_template('pages/artists.html', artists=artist_listing(page), page=page, facets=facets)
+
+async def search_artists():
+  keyword = flask_request.values.get('search_term', '')
+  matches, query, columns = search_listing_query(Artist, keyword)
+  page = await paginate_request(query, columns, search_term=keyword)
+  response = search_results(await count(matches), page)
+  return render_template('pages/search_artists.html', results=response, search_term=keyword, page=page)
+
+@conditional(lambda artist_id: artist_page_version_query(artist_id, datetime.now()), detail_validators)
+async def show_artist(artist_id):
+  async def build():
+    return artist_page_from_rows(await fetch(artist_page_query(artist_id).statement))
+  data = await detail_cache.get_or_set_async('artist:%d' % artist_id, build, page_timeout, page_version())
+  if data is None:
+    abort(404)
+  return render_template('pages/show_artist.html', artist=data)
+
+@conditional(lambda: table_version_query('Shows', 'Venue', 'Artist'), listing_validators)
+async def shows():
+  query, columns = shows_query()
+  page = await paginate_request(query, columns)
+  return render_template('pages/shows.html', shows=show_listing(page), page=page)
+
+#----------------------------------------------------------------------------#
+# ASGI app.
+#----------------------------------------------------------------------------#
+
+def flask_context(controller):
+  # runs controller in a Flask request context for the ASGI request and turns what it
+  # returns, or the HTTP error it raised, into a response through the Flask app
+  async def endpoint(request):
+    with app.test_request_context(
+        request.url.path,
+        base_url=str(request.base_url),
+        method=request.method,
+        query_string=request.url.query,
+        headers=list(request.headers.items()),
+        environ_base={'REMOTE_ADDR': request.client.host if request.client else None}):
+      # the latency, status and in-flight metrics of metrics.init_metrics, a request that
+      # raised counts as a 500 there as well
+      started, status = start_request(), 500
+      try:
+        async with request_session():
+          try:
+            response = app.make_response(await controller(**request.path_params))
+          except HTTPException as e:
+            response = app.make_response(app.handle_http_exception(e))
+        # the session part of app.process_response, without the after request hooks: the
+        # flashed messages a page has shown are removed from the cookie
+        if not app.session_interface.is_null_session(session):
+          app.session_interface.save_session(app, session, response)
+        status = response.status_code
+      finally:
+        finish_request(started, status)
+    converted = Response(response.get_data(), status_code=response.status_code)
+    converted.raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    return converted
+  return endpoint
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+  yield
+  for engine in engines.values():
+    await engine.dispose()
+
+# the search routes take GET only, the form posts fall through to the WSGI app
+asgi_app = Starlette(lifespan=lifespan, routes=[
+  Route('/venues', flask_context(venues)),
+  Route('/venues/search', flask_context(search_venues), methods=['GET']),
+  Route('/venues/{venue_id:int}', flask_context(show_venue)),
+  Route('/artists', flask_context(artists)),
+  Route('/artists/search', flask_context(search_artists), methods=['GET']),
+  Route('/artists/{artist_id:int}', flask_context(show_artist)),
+  Route('/shows', flask_context(shows)),
+  Mount('', app=WSGIMiddleware(app)),
+])
@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from flask import request, send_from_directory
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+# `flask spotlight build-assets` (or `python assets.py`) writes static/dist: the bundles
+# below and a copy of every other static file, each named after a hash of its content,
+# with .gz and .br siblings for the text files, resized WebP/AVIF/JPEG variants of the
+# IMAGES, and manifest.json mapping the original names to the built ones. a changed file
+# gets a new name, so everything in dist can be cached by browsers for good
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# in the order layouts/main.html loaded the separate files
+BUNDLES = {
+  'css/app.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                  'css/main.responsive.css', 'css/main.quickfix.css'],
+  'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  # deferred, runs after jQuery
+  'js/app.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+# widths of the variants, an image is never scaled up
+IMAGES = {
+  'img/front-splash.jpg': [480, 720, 960, 1440],
+}
+IMAGE_FORMATS = [('image/avif', 'avif', {'quality': 50}), ('image/webp', 'webp', {'quality': 75}),
+                 ('image/jpeg', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True})]
+
+COMPRESS = {'.css', '.js', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+def fingerprint(name, content):
+  base, ext = posixpath.splitext(name)
+  return '{}/{}.{}{}'.format(DIST, base, hashlib.sha256(content).hexdigest()[:12], ext)
+
+def rewrite_css_urls(css, source, built, files):
+  # url()s in a bundled stylesheet are relative to its source file, point them at the
+  # built copy of the file they name, relative to where the bundle is written
+  def replace(match):
+    url = match.group(2)
+    if re.match(r'^([a-z]+:|/|#)', url):
+      return match.group(0)
+    path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    target = files.get(target, target)
+    return 'url("{}{}")'.format(posixpath.relpath(target, posixpath.dirname(built)), suffix)
+  return CSS_URL.sub(replace, css)
+
+def compress(path):
+  # .gz and .br next to path, kept only where they are smaller. returns the encodings
+  try:
+    import brotli
+  except ImportError:
+    raise RuntimeError('building the assets needs the brotli package, pip install brotli')
+  with open(path, 'rb') as f:
+    content = f.read()
+  encodings = []
+  for encoding, suffix, packed in (
+      ('br', '.br', brotli.compress(content, quality=11)),
+      ('gzip', '.gz', gzip.compress(content, compresslevel=9, mtime=0))):
+    if len(packed) < len(content):
+      with open(path + suffix, 'wb') as f:
+        f.write(packed)
+      encodings.append(encoding)
+  return encodings
+
+def resize_image(static_folder, name, widths):
+  # {mimetype: [(width, built name)]} for the variants of one image
+  try:
+    from PIL import Image
+  except ImportError:
+    raise RuntimeError('building the assets needs Pillow, pip install Pillow')
+  variants = {}
+  with Image.open(os.path.join(static_folder, name)) as image:
+    image = image.convert('RGB')
+    base = posixpath.splitext(name)[0]
+    for width in sorted({min(width, image.width) for width in widths}):
+      resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+      for mimetype, ext, options in IMAGE_FORMATS:
+        tmp = os.path.join(static_folder, DIST, 'tmp.' + ext)
+        resized.save(tmp, **options)
+        with open(tmp, 'rb') as f:
+          built = fingerprint('{}-{}.{}'.format(base, width, ext), f.read())
+        os.makedirs(os.path.dirname(os.path.join(static_folder, built)), exist_ok=True)
+        os.replace(tmp, os.path.join(static_folder, built))
+        variants.setdefault(mimetype, []).append((width, built))
+  return variants
+
+def static_files(static_folder):
+  # every static file except the build output and what browsers never ask for
+  for root, dirs, names in os.walk(static_folder):
+    if os.path.abspath(root) == os.path.abspath(static_folder):
+      dirs[:] = [d for d in dirs if d != DIST]
+    for name in names:
+      if name.startswith('.') or name.endswith('.map'):
+        continue
+      yield posixpath.join(*os.path.relpath(os.path.join(root, name), static_folder).split(os.sep))
+
+def write(static_folder, built, content):
+  path = os.path.join(static_folder, built)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(content)
+  return path
+
+def build(static_folder):
+  # rebuilds static/dist from scratch, returns the manifest
+  shutil.rmtree(os.path.join(static_folder, DIST), ignore_errors=True)
+  os.makedirs(os.path.join(static_folder, DIST))
+  files, encodings, paths = {}, {}, {}
+
+  # plain files first, the stylesheet bundles refer to them
+  for name in static_files(static_folder):
+    with open(os.path.join(static_folder, name), 'rb') as f:
+      content = f.read()
+    files[name] = fingerprint(name, content)
+    paths[files[name]] = write(static_folder, files[name], content)
+
+  for bundle, sources in BUNDLES.items():
+    parts = []
+    for source in sources:
+      with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+        text = f.read()
+      if bundle.endswith('.css'):
+        text = rewrite_css_urls(text, source, fingerprint(bundle, b''), files)
+      # a script without a trailing semicolon must not run into the next one
+      parts.append(text if bundle.endswith('.css') else text.rstrip() + '\n;')
+    content = '\n'.join(parts).encode('utf-8')
+    files[bundle] = fingerprint(bundle, content)
+    paths[files[bundle]] = write(static_folder, files[bundle], content)
+
+  for built, path in paths.items():
+    if posixpath.splitext(built)[1] in COMPRESS:
+      encodings[built] = compress(path)
+
+  images = {name: resize_image(static_folder, name, widths) for name, widths in IMAGES.items()}
+  manifest = {'files': files, 'encodings': encodings, 'images': images}
+  with open(os.path.join(static_folder, DIST, MANIFEST), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  return manifest
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+def load_manifest(static_folder):
+  # an empty manifest when the assets have not been built, e.g. in development
+  try:
+    with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return {'files': {}, 'encodings': {}, 'images': {}}
+
+def init_assets(app):
+  # url_for('static', filename=...) returns the built file when there is one, the
+  # bundles fall back to their separate source files until the assets are built
+  manifest = load_manifest(app.static_folder)
+  app.extensions['assets'] = manifest
+  built = set(manifest['files'].values()) | {name for variants in manifest['images'].values()
+                                             for sizes in variants.values() for width, name in sizes}
+  url_for = app.url_for
+
+  def asset_url_for(endpoint, **values):
+    if endpoint == 'static' and values.get('filename') in manifest['files']:
+      values['filename'] = manifest['files'][values['filename']]
+    return url_for(endpoint, **values)
+
+  def asset_urls(bundle):
+    if bundle in manifest['files']:
+      return [asset_url_for('static', filename=bundle)]
+    return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+  def responsive_image(name):
+    # src for the <img> and (mimetype, srcset) for each <source> of a <picture>
+    variants = manifest['images'].get(name)
+    if not variants:
+      return {'src': asset_url_for('static', filename=name), 'sources': []}
+    def srcset(sizes):
+      return ', '.join('{} {}w'.format(url_for('static', filename=built), width) for width, built in sizes)
+    jpeg = variants['image/jpeg']
+    return {
+      # a mid-sized jpeg for browsers without <picture> support
+      'src': url_for('static', filename=jpeg[len(jpeg) // 2][1]),
+      'sources': [(mimetype, srcset(variants[mimetype])) for mimetype, ext, options in IMAGE_FORMATS],
+    }
+
+  app.url_for = asset_url_for
+  app.jinja_env.globals.update(url_for=asset_url_for, asset_urls=asset_urls, responsive_image=responsive_image)
+
+  def static(filename):
+    if filename not in built:
+      return app.send_static_file(filename)
+    # built files never change, serve the precompressed copy the client accepts
+    for encoding in manifest['encodings'].get(filename, []):
+      if encoding in request.accept_encodings:
+        response = send_from_directory(app.static_folder, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+      response = app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['ASSETS_MAX_AGE']
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+  app.view_functions['static'] = static
+
+if __name__ == '__main__':
+  manifest = build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+  print('built {} files and {} images'.format(len(manifest['files']), len(manifest['images'])))
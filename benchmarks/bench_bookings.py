@@ -0,0 +1,99 @@
+"""Booking-conflict checks against a large synthetic Shows table.
+
+  python benchmarks/bench_bookings.py postgresql://localhost:5432/spotlight_bench --shows 1000000
+
+Seeds the database with benchmarks/synthetic.py (the tables are dropped and recreated,
+use a scratch database). Prints p50/p95 of checking one proposed show and a batch of
+--batch proposed shows with bookings.find_conflicts, next to the same batch checked one
+show at a time with a plain overlap query per venue and per artist, and the plan of the
+batch query so the GiST index use can be checked.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import app
+from bookings import booked_conflicts, find_conflicts
+from models import db, Venue, Artist, Shows
+from synthetic import generate
+
+def proposed_shows(rng, venue_ids, artist_ids, count):
+  # spread like the synthetic shows, so about one in ten lands on a booked slot
+  today = datetime.combine(datetime.now().date(), datetime.min.time())
+  return [{
+    'venue_id': venue_ids[int(len(venue_ids) * rng.random() ** 2)],
+    'artist_id': artist_ids[int(len(artist_ids) * rng.random() ** 2)],
+    'start_time': today + timedelta(days=rng.randint(-365, 365), hours=rng.choice([18, 19, 20, 21, 22])),
+    'duration_minutes': 120,
+  } for _ in range(count)]
+
+def overlap_per_show(proposed):
+  # the check the GiST indexes replace, two queries per proposed show
+  conflicts = 0
+  for show in proposed:
+    end = show['start_time'] + timedelta(minutes=show['duration_minutes'])
+    for column in (Shows.venue_id, Shows.artist_id):
+      key = 'venue_id' if column is Shows.venue_id else 'artist_id'
+      conflicts += db.session.query(Shows.id).filter(
+        column == show[key], Shows.start_time < end,
+        Shows.start_time + Shows.duration_minutes * db.text("interval '1 minute'") > show['start_time']).count()
+  return conflicts
+
+def timed(run, repeat):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    run()
+    samples.append((time.perf_counter() - start) * 1000)
+  samples.sort()
+  return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--shows', type=int, default=1000000)
+  parser.add_argument('--batch', type=int, default=1000)
+  parser.add_argument('--repeat', type=int, default=10)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    generate(args.shows, args.seed, reset=True)
+    db.session.execute(db.text('ANALYZE "Shows"'))
+    db.session.commit()
+    rng = random.Random(args.seed)
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    single = proposed_shows(rng, venue_ids, artist_ids, 1)
+    batch = proposed_shows(rng, venue_ids, artist_ids, args.batch)
+    print('{} shows, {} proposed: {} conflicts'.format(Shows.query.count(), len(batch), len(find_conflicts(batch))))
+    for label, run in (
+        ('one show', lambda: find_conflicts(single)),
+        ('batch, one query', lambda: find_conflicts(batch)),
+        ('batch, per show', lambda: overlap_per_show(batch))):
+      p50, p95 = timed(run, args.repeat)
+      print('  {:<18} p50 {:9.2f} ms   p95 {:9.2f} ms'.format(label, p50, p95))
+    # the plan of the batch query, captured from its execution
+    plans = []
+    def explain(conn, cursor, statement, parameters, context, executemany):
+      if 'unnest(' in statement and '"Shows"' in statement:
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        plans.extend(line for line, in cursor.fetchall())
+    event.listen(db.engine, 'before_cursor_execute', explain)
+    booked_conflicts(batch)
+    event.remove(db.engine, 'before_cursor_execute', explain)
+    print('  plan:')
+    for line in plans:
+      print('    ' + line)
+
+if __name__ == '__main__':
+  main()
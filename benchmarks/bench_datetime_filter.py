@@ -0,0 +1,53 @@
+"""Compares the datetime template filter with the one it replaced.
+
+  python benchmarks/bench_datetime_filter.py [--tiles 300] [--repeat 20]
+
+Formats one /shows page worth of start times with the 'full' format, as datetime objects
+(what /shows passes now) and as strings (what the detail pages pass), against the old
+filter that went through str() and dateutil on every call.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from app import format_datetime
+
+def previous_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--tiles', type=int, default=300)
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+
+  start = datetime(2026, 1, 1, 20, 0)
+  values = [start + timedelta(hours=7 * i, minutes=i % 60) for i in range(args.tiles)]
+  strings = [str(value) for value in values]
+  assert [format_datetime(v, 'full') for v in values] == [previous_format_datetime(v, 'full') for v in strings]
+
+  cases = [
+    ('previous filter, str(start_time)', lambda: [previous_format_datetime(v, 'full') for v in strings]),
+    ('filter, datetime', lambda: [format_datetime(v, 'full') for v in values]),
+    ('filter, str(start_time)', lambda: [format_datetime(v, 'full') for v in strings]),
+  ]
+  baseline = None
+  for name, run in cases:
+    best = min(timeit.repeat(run, number=1, repeat=args.repeat)) * 1000
+    baseline = baseline or best
+    print('{:<34} {:8.3f} ms per {} tiles  ({:.1f}x)'.format(name, best, args.tiles, baseline / best))
+
+if __name__ == '__main__':
+  main()
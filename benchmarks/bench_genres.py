@@ -0,0 +1,106 @@
+"""Genre filter and facet latency on large synthetic Venue and Artist tables.
+
+  python benchmarks/bench_genres.py postgresql://localhost:5432/spotlight_bench --rows 100000
+
+The database is filled with synthetic rows, point it at a scratch database.
+Prints p50/p95 latency of the genre filtered /venues and /artists listings per filter,
+then times the filter and facet queries against the `'Jazz' = ANY(genres)` form they
+replace and prints the plan of each, so the GIN index use can be checked.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from genres import GENRES, filter_by_genres, facet_query
+from models import db, Venue, Artist
+
+FILTERS = [(['Jazz'], 'any'), (['Jazz', 'Blues'], 'any'), (['Jazz', 'Blues'], 'all'),
+           (['Folk', 'Funk', 'Soul'], 'all')]
+
+def seed(model, rows):
+  # one to three genres per row, drawn in SQL so the rows take seconds
+  table = model.__table__.name
+  genres = '(ARRAY[' + ', '.join("'%s'" % g for g in GENRES) + '])'
+  n = len(GENRES)
+  extra = ', address' if model is Venue else ''
+  extra_value = ", '1 Main Street'" if model is Venue else ''
+  db.session.execute(db.text('''
+    INSERT INTO "{table}" (name, city, state, genres{extra})
+    SELECT 'Listing ' || i, 'San Francisco', 'CA',
+           ARRAY(SELECT DISTINCT {genres}[1 + floor(random() * {n})::int]
+                 FROM generate_series(1, 1 + i % 3)){extra_value}
+    FROM generate_series((SELECT count(*) FROM "{table}") + 1, :rows) AS i
+  '''.format(table=table, genres=genres, n=n, extra=extra, extra_value=extra_value)), {'rows': rows})
+  db.session.commit()
+  db.session.execute(db.text('ANALYZE "{}"'.format(table)))
+  db.session.commit()
+
+def percentiles(samples):
+  samples.sort()
+  return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def timed_get(client, url, genres, match, repeat):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    response = client.get(url, query_string={'genre': genres, 'match': match})
+    samples.append((time.perf_counter() - start) * 1000)
+    assert response.status_code == 200, response.status_code
+  return percentiles(samples)
+
+def timed_query(query, repeat):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    query.all()
+    samples.append((time.perf_counter() - start) * 1000)
+  return percentiles(samples)
+
+def any_filter(query, model, genres, match):
+  # the per-genre ANY() form, which no index on genres can serve
+  conditions = [db.literal(genre) == db.func.any(model.genres) for genre in genres]
+  return query.filter(db.or_(*conditions) if match == 'any' else db.and_(*conditions))
+
+def explain(query):
+  statement = query.statement.compile(db.engine)
+  plan = db.session.connection().exec_driver_sql('EXPLAIN ANALYZE ' + str(statement), statement.params).fetchall()
+  for line in plan:
+    print('      ' + line[0])
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--rows', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    db.create_all()
+    for model in (Venue, Artist):
+      seed(model, args.rows)
+    client = app.test_client()
+    for model, url in ((Venue, '/venues'), (Artist, '/artists')):
+      print('{} ({} rows)'.format(url, model.query.count()))
+      for genres, match in FILTERS:
+        p50, p95 = timed_get(client, url, genres, match, args.repeat)
+        print('  {:<28} p50 {:8.2f} ms   p95 {:8.2f} ms'.format('{} {}'.format(match, '+'.join(genres)), p50, p95))
+      genres, match = FILTERS[1]
+      count = db.session.query(db.func.count(model.id))
+      for label, query in (
+          ('count, && / @>', filter_by_genres(count, model, genres, match)),
+          ('count, = ANY()', any_filter(count, model, genres, match)),
+          ('facets', facet_query(model, genres, match)),
+          ('facets, = ANY()', any_filter(facet_query(model, [], match), model, genres, match))):
+        p50, p95 = timed_query(query, args.repeat)
+        print('  {:<28} p50 {:8.2f} ms   p95 {:8.2f} ms'.format(label, p50, p95))
+        explain(query)
+
+if __name__ == '__main__':
+  main()
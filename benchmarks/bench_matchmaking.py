@@ -0,0 +1,93 @@
+"""Suggested-artists latency against a large synthetic Artist table.
+
+  python benchmarks/bench_matchmaking.py postgresql://localhost:5432/spotlight_bench --rows 100000
+
+The database is filled with synthetic rows, point it at a scratch database.
+Prints the time to build the artist candidate matrix, p50/p95 of ranking alone and of
+whole /venues/<id>/suggested-artists requests, for two venues with fifty past shows each.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, artist_candidates
+from genres import GENRES
+from models import db, Venue, Artist, Shows
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+          ('Seattle', 'WA'), ('Nashville', 'TN'), ('Boston', 'MA'), ('Denver', 'CO')]
+
+def seed(rows):
+  # one to three genres per artist and every other artist seeking a venue, drawn in SQL
+  genres = '(ARRAY[' + ', '.join("'%s'" % g for g in GENRES) + '])'
+  cities = '(ARRAY[' + ', '.join("'%s'" % c for c, s in CITIES) + '])'
+  states = '(ARRAY[' + ', '.join("'%s'" % s for c, s in CITIES) + '])'
+  db.session.execute(db.text('''
+    INSERT INTO "Artist" (name, city, state, genres, seeking_venue)
+    SELECT 'Artist ' || i, {cities}[1 + i % {c}], {states}[1 + i % {c}],
+           ARRAY(SELECT DISTINCT {genres}[1 + floor(random() * {n})::int] FROM generate_series(1, 1 + i % 3)),
+           i % 2 = 0
+    FROM generate_series((SELECT count(*) FROM "Artist") + 1, :rows) AS i
+  '''.format(genres=genres, n=len(GENRES), cities=cities, states=states, c=len(CITIES))), {'rows': rows})
+  db.session.commit()
+  if not Venue.query.count():
+    now = datetime.now()
+    for i, (city, state) in enumerate(CITIES[:2]):
+      venue = Venue(name='Bench Venue %d' % i, city=city, state=state, address='1 Main Street',
+                    genres=['Jazz', 'Blues', 'Soul'], seeking_talent=True)
+      db.session.add(venue)
+      db.session.flush()
+      artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id).limit(50)]
+      db.session.add_all(Shows(venue_id=venue.id, artist_id=artist_id, start_time=now - timedelta(days=day))
+                         for day, artist_id in enumerate(artist_ids, 1))
+    db.session.commit()
+  db.session.execute(db.text('ANALYZE "Artist"'))
+  db.session.commit()
+
+def percentiles(samples):
+  samples.sort()
+  return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def timed(run, repeat):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    run()
+    samples.append((time.perf_counter() - start) * 1000)
+  return percentiles(samples)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--rows', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    db.create_all()
+    seed(args.rows)
+    start = time.perf_counter()
+    artist_candidates.build(artist_candidates.current_version())
+    built = (time.perf_counter() - start) * 1000
+    print('artists: {} rows, {} seeking a venue, matrix built in {:.0f} ms'.format(
+      Artist.query.count(), Artist.query.filter(Artist.seeking_venue.is_(True)).count(), built))
+    client = app.test_client()
+    for venue in Venue.query.order_by(Venue.id):
+      shared_shows = {id: 1 for id, in db.session.query(Shows.artist_id).filter(Shows.venue_id == venue.id)}
+      p50, p95 = timed(lambda: artist_candidates.rank(venue.genres, venue.city, venue.state, shared_shows), args.repeat)
+      print('  {:<24} rank     p50 {:8.2f} ms   p95 {:8.2f} ms'.format(venue.name, p50, p95))
+      def get():
+        response = client.get('/venues/%d/suggested-artists' % venue.id)
+        assert response.status_code == 200, response.status_code
+      p50, p95 = timed(get, args.repeat)
+      print('  {:<24} request  p50 {:8.2f} ms   p95 {:8.2f} ms'.format(venue.name, p50, p95))
+
+if __name__ == '__main__':
+  main()
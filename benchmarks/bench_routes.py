@@ -0,0 +1,267 @@
+"""Latency and SQL query counts of every route in app.py, compared against a baseline.
+
+  python benchmarks/bench_routes.py postgresql://localhost:5432/spotlight_bench --shows 100000 \\
+      --output results.json --baseline benchmarks/baseline.json
+
+Seeds the database with benchmarks/synthetic.py (the tables are dropped and recreated,
+use a scratch database), then requests every route through the test client --repeat
+times. Detail and edit pages pick a different seeded venue or artist each time, and the
+create, edit and delete handlers work on listings created by the run itself. Each route
+gets p50/p95/p99 latency and the most SQL statements one request ran, written as json
+to --output. With --baseline, the run exits with status 1 when a route's p95 is more
+than --tolerance slower than the baseline's (and at least --slack ms), or when it runs
+more queries. Save a run on a quiet machine as the baseline and compare like with like.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import app
+from models import db, Venue, Artist, Shows
+from synthetic import generate
+
+#----------------------------------------------------------------------------#
+# Scenarios, one per endpoint.
+#----------------------------------------------------------------------------#
+
+def listing_form(run, kind, name):
+  data = {
+    'csrf_token': run.csrf_token(), 'name': name, 'city': 'Springfield', 'state': 'CA', 'phone': '4155550123', 'genres': ['Jazz'],
+    'image_link': '', 'facebook_link': 'https://www.facebook.com/bench',
+    'website_link': 'https://example.com/bench', 'seeking_description': ''
+  }
+  if kind == 'venue':
+    data['address'] = '1 Bench Street'
+  return data
+
+def created_id(model, name):
+  return db.session.query(model.id).filter(model.name == name).scalar()
+
+class Run(object):
+  # state shared by the scenarios: the seeded id ranges and the listings the run created
+  def __init__(self, client, seed):
+    self.client = client
+    self.rng = random.Random(seed)
+    self.venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    self.artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    self.last_show_id = db.session.query(db.func.max(Shows.id)).scalar() or 0
+    self.created = {'venue': [], 'artist': []}
+    self.count = 0
+    self._csrf_token = None
+    self.profile_token = app.config['PROFILE_TOKEN']
+
+  def venue(self):
+    return self.rng.choice(self.venue_ids)
+
+  def artist(self):
+    return self.rng.choice(self.artist_ids)
+
+  def csrf_token(self):
+    # posted like a browser would, the token is bound to the test client's session cookie
+    if self._csrf_token is None:
+      page = self.client.get('/venues/create').get_data(as_text=True)
+      self._csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    return self._csrf_token
+
+  def name(self, kind):
+    self.count += 1
+    return 'Bench {} {}'.format(kind, self.count)
+
+# a scenario returns the (method, path, request arguments) to time, the lookups it needs to
+# build them are not counted against the route
+
+def get(path, **query):
+  return 'GET', path, {'query_string': query}
+
+def create_submission(kind):
+  def scenario(run):
+    name = run.name(kind)
+    run.created[kind].append(name)
+    return 'POST', '/{}s/create'.format(kind), {'data': listing_form(run, kind, name)}
+  return scenario
+
+def edit_submission(kind, model):
+  def scenario(run):
+    name = run.created[kind][-1]
+    return 'POST', '/{}s/{}/edit'.format(kind, created_id(model, name)), {'data': listing_form(run, kind, name)}
+  return scenario
+
+def delete_listing(kind, model):
+  return lambda run: get('/{}s/{}/delete'.format(kind, created_id(model, run.created[kind].pop())))
+
+def create_show_submission(run):
+  # a random day far ahead, so the show is booked rather than rejected as a conflict
+  start_time = datetime(2030, 1, 1, 20) + timedelta(days=run.rng.randrange(36500))
+  return 'POST', '/shows/create', {'data': {
+    'csrf_token': run.csrf_token(), 'venue_id': run.venue(), 'artist_id': run.artist(),
+    'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'duration_minutes': 120
+  }}
+
+def create_series_submission(run):
+  # a weekly residency of twelve shows, checked and inserted in one transaction
+  method, path, options = create_show_submission(run)
+  options['data'].update(repeat='weekly', repeat_interval=1, repeat_count=12)
+  return method, path, options
+
+def download_profile(run):
+  # profiles one /shows request first, the download is what is timed
+  name = run.client.get('/shows', headers={'X-Profile': run.profile_token}).headers['X-Profile-Id']
+  return 'GET', '/profiles/' + name, {'headers': {'X-Profile': run.profile_token}}
+
+# exports are measured on the last thousand shows, a full dump at scale is a different
+# benchmark
+def export(path):
+  return lambda run: get(path, since=max(0, run.last_show_id - 1000))
+
+# in the order they run each round, creates come before the edits and deletes that use
+# their listings
+SCENARIOS = [
+  ('index', lambda run: get('/')),
+  ('search_suggest', lambda run: get('/search/suggest', q=run.rng.choice(['ve', 'hall', 'the blue', 'sax']))),
+  ('cache_stats', lambda run: get('/cache/stats')),
+  ('metrics', lambda run: get('/metrics')),
+  ('venues', lambda run: get('/venues')),
+  ('venues_by_genre', lambda run: get('/venues', genre=['Jazz', 'Blues'], match=run.rng.choice(['any', 'all']))),
+  ('search_venues', lambda run: get('/venues/search', search_term=run.rng.choice(['Hop', 'velvet lounge', 'Salem']))),
+  ('show_venue', lambda run: get('/venues/%d' % run.venue())),
+  ('suggested_artists', lambda run: get('/venues/%d/suggested-artists' % run.venue())),
+  ('create_venue_form', lambda run: get('/venues/create')),
+  ('create_venue_submission', create_submission('venue')),
+  ('edit_venue', lambda run: get('/venues/%d/edit' % run.venue())),
+  ('edit_venue_submission', edit_submission('venue', Venue)),
+  ('delete_venue', delete_listing('venue', Venue)),
+  ('artists', lambda run: get('/artists')),
+  ('artists_by_genre', lambda run: get('/artists', genre=['Jazz', 'Blues'], match=run.rng.choice(['any', 'all']))),
+  ('search_artists', lambda run: get('/artists/search', search_term=run.rng.choice(['Band', 'electric garden', 'Salem']))),
+  ('show_artist', lambda run: get('/artists/%d' % run.artist())),
+  ('suggested_venues', lambda run: get('/artists/%d/suggested-venues' % run.artist())),
+  ('create_artist_form', lambda run: get('/artists/create')),
+  ('create_artist_submission', create_submission('artist')),
+  ('edit_artist', lambda run: get('/artists/%d/edit' % run.artist())),
+  ('edit_artist_submission', edit_submission('artist', Artist)),
+  ('delete_artist', delete_listing('artist', Artist)),
+  ('shows', lambda run: get('/shows')),
+  ('create_shows', lambda run: get('/shows/create')),
+  ('create_show_submission', create_show_submission),
+  ('create_series_submission', create_series_submission),
+  ('export', export('/export/shows.ndjson')),
+  ('download_profile', download_profile),
+  ('list_profiles', lambda run: ('GET', '/profiles', {'headers': {'X-Profile': run.profile_token}})),
+]
+
+#----------------------------------------------------------------------------#
+# Measuring.
+#----------------------------------------------------------------------------#
+
+def percentile(samples, p):
+  samples = sorted(samples)
+  return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def measure(run, repeat, warmup):
+  statements = []
+  def count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+  timings = {name: [] for name, scenario in SCENARIOS}
+  queries = {name: 0 for name, scenario in SCENARIOS}
+  event.listen(db.engine, 'before_cursor_execute', count)
+  try:
+    for iteration in range(warmup + repeat):
+      for name, scenario in SCENARIOS:
+        method, path, kwargs = scenario(run)
+        del statements[:]
+        started = time.perf_counter()
+        response = run.client.open(path, method=method, **kwargs)
+        response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+          raise RuntimeError('{} answered {}'.format(name, response.status_code))
+        if iteration >= warmup:
+          timings[name].append(elapsed)
+          queries[name] = max(queries[name], len(statements))
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', count)
+  return {
+    name: {
+      'p50_ms': round(statistics.median(timings[name]), 3),
+      'p95_ms': round(percentile(timings[name], 0.95), 3),
+      'p99_ms': round(percentile(timings[name], 0.99), 3),
+      'queries': queries[name]
+    } for name, scenario in SCENARIOS
+  }
+
+def regressions(routes, baseline, tolerance, slack):
+  found = []
+  for name, result in sorted(routes.items()):
+    before = baseline['routes'].get(name)
+    if before is None:
+      continue
+    if result['p95_ms'] > before['p95_ms'] * (1 + tolerance) and result['p95_ms'] - before['p95_ms'] > slack:
+      found.append('{}: p95 {:.2f} ms, baseline {:.2f} ms'.format(name, result['p95_ms'], before['p95_ms']))
+    if result['queries'] > before['queries']:
+      found.append('{}: {} queries, baseline {}'.format(name, result['queries'], before['queries']))
+  return found
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--shows', type=int, default=10000)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--repeat', type=int, default=50)
+  parser.add_argument('--warmup', type=int, default=3)
+  parser.add_argument('--output', help='write the results to this json file')
+  parser.add_argument('--baseline', help='json results of an earlier run to compare against')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown, 0.25 is 25%%')
+  parser.add_argument('--slack', type=float, default=2.0, help='p95 slowdowns below this many ms are noise')
+  args = parser.parse_args()
+
+  endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - {'static'}
+  missing = endpoints - {name for name, scenario in SCENARIOS}
+  if missing:
+    sys.exit('no scenario for ' + ', '.join(sorted(missing)))
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  app.config['PROFILE_TOKEN'] = app.config['PROFILE_TOKEN'] or 'bench'
+  app.config['PROFILE_SAMPLE_RATE'] = 0.0
+  with app.app_context():
+    generate(args.shows, args.seed, reset=True)
+    run = Run(app.test_client(), args.seed)
+    routes = measure(run, args.repeat, args.warmup)
+
+  results = {
+    'meta': {
+      'shows': args.shows, 'seed': args.seed, 'repeat': args.repeat,
+      'python': platform.python_version(), 'machine': platform.node(),
+      'date': time.strftime('%Y-%m-%dT%H:%M:%S')
+    },
+    'routes': routes
+  }
+  print('{:<26} {:>9} {:>9} {:>9} {:>8}'.format('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+  for name, result in routes.items():
+    print('{:<26} {p50_ms:9.2f} {p95_ms:9.2f} {p99_ms:9.2f} {queries:8d}'.format(name, **result))
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    if baseline['meta']['shows'] != args.shows:
+      print('warning: the baseline was recorded at {} shows'.format(baseline['meta']['shows']))
+    found = regressions(routes, baseline, args.tolerance, args.slack)
+    for line in found:
+      print('REGRESSION ' + line)
+    sys.exit(1 if found else 0)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,84 @@
+"""Search latency on large synthetic Venue and Artist tables.
+
+  python benchmarks/bench_search.py postgresql://localhost:5432/spotlight_bench --rows 1000000
+
+The database is filled with synthetic rows, point it at a scratch database.
+Prints p50/p95 latency of /venues/search and /artists/search per search term,
+and the plan of each search so the trigram index use can be checked.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, search_query
+from models import db, Venue, Artist
+
+WORDS = ['The', 'Blue', 'Velvet', 'Musical', 'Hop', 'Dueling', 'Pianos', 'Park', 'Square',
+         'Live', 'Coffee', 'Wild', 'Sax', 'Band', 'Guns', 'Petals', 'Electric', 'Garden',
+         'Lounge', 'Hall', 'Room', 'Cellar', 'Quartet', 'Collective']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+          ('Seattle', 'WA'), ('Nashville', 'TN'), ('Boston', 'MA'), ('Denver', 'CO')]
+TERMS = ['Hop', 'music', 'velvet lounge', 'sax band', 'Nashville', 'Austin, TX', 'qwzx']
+
+def seed(model, rows):
+  # builds names like "Velvet Garden Lounge 123" in SQL, so a million rows take seconds
+  table = model.__table__.name
+  words = '(ARRAY[' + ', '.join("'%s'" % w for w in WORDS) + '])'
+  cities = '(ARRAY[' + ', '.join("'%s'" % c for c, s in CITIES) + '])'
+  states = '(ARRAY[' + ', '.join("'%s'" % s for c, s in CITIES) + '])'
+  n = len(WORDS)
+  extra = ', address' if model is Venue else ''
+  extra_value = ", '1 Main Street'" if model is Venue else ''
+  db.session.execute(db.text('''
+    INSERT INTO "{table}" (name, city, state, genres{extra})
+    SELECT {words}[1 + i % {n}] || ' ' || {words}[1 + (i / {n}) % {n}] || ' ' || {words}[1 + (i / {nn}) % {n}] || ' ' || i,
+           {cities}[1 + i % {c}], {states}[1 + i % {c}], ARRAY['Jazz']{extra_value}
+    FROM generate_series((SELECT count(*) FROM "{table}") + 1, :rows) AS i
+  '''.format(table=table, words=words, n=n, nn=n * n, cities=cities, states=states,
+             c=len(CITIES), extra=extra, extra_value=extra_value)), {'rows': rows})
+  db.session.commit()
+  db.session.execute(db.text('ANALYZE "{}"'.format(table)))
+  db.session.commit()
+
+def timed(client, url, term, repeat):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    response = client.get(url, query_string={'search_term': term})
+    samples.append((time.perf_counter() - start) * 1000)
+    assert response.status_code == 200, response.status_code
+  samples.sort()
+  return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--rows', type=int, default=1000000)
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    db.create_all()
+    for model in (Venue, Artist):
+      seed(model, args.rows)
+    client = app.test_client()
+    for model, url in ((Venue, '/venues/search'), (Artist, '/artists/search')):
+      print('{} ({} rows)'.format(url, model.query.count()))
+      for term in TERMS:
+        p50, p95 = timed(client, url, term, args.repeat)
+        print('  {:<16} p50 {:8.2f} ms   p95 {:8.2f} ms'.format(repr(term), p50, p95))
+      matches, distance = search_query(model, TERMS[0])
+      statement = matches.statement.compile(db.engine)
+      plan = db.session.connection().exec_driver_sql('EXPLAIN ' + str(statement), statement.params).fetchall()
+      print('  plan:')
+      for line in plan:
+        print('    ' + line[0])
+
+if __name__ == '__main__':
+  main()
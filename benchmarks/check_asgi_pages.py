@@ -0,0 +1,103 @@
+"""Checks that the ASGI app in asgi.py serves the same pages as the WSGI app.
+
+  python benchmarks/check_asgi_pages.py postgresql://localhost:5432/spotlight_scratch
+
+Requests every page the async path serves, including the 404 and 400 cases, through the
+Flask test client and through the ASGI app, and compares status and body byte for byte.
+Then edits a venue through each app and follows the redirect: the flashed message has to
+show once, the response has to update the session cookie, and the next request must not
+show it again. The tables of the database are dropped and recreated. Exits with status
+1 if any check fails.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FLASH = b'successfully updated'
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  args = parser.parse_args()
+
+  os.environ['DATABASE_URL'] = args.database_url
+  import httpx
+  from app import app, detail_cache
+  from asgi import asgi_app
+  from models import db, Venue, Artist, Shows
+
+  now = datetime.now()
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+    venue = Venue(name='The Hop', city='San Francisco', state='CA', address='1 Main Street', genres=['Jazz'])
+    artist = Artist(name='Sax Band', city='San Francisco', state='CA', genres=['Jazz'])
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    db.session.add_all([
+      Shows(venue_id=venue.id, artist_id=artist.id, start_time=now - timedelta(days=3)),
+      Shows(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=3)),
+    ])
+    db.session.commit()
+    venue_id, artist_id = venue.id, artist.id
+
+  failed = []
+  def check(label, ok):
+    print('ok  ' if ok else 'FAIL', label)
+    if not ok:
+      failed.append(label)
+
+  # one event loop for all ASGI requests, the async engines' connections belong to it
+  loop = asyncio.new_event_loop()
+  asgi_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url='http://localhost')
+  wsgi_client = app.test_client()
+
+  def asgi_request(method, path, data=None):
+    response = loop.run_until_complete(asgi_client.request(method, path, data=data))
+    return response.status_code, response.headers, response.content
+
+  def wsgi_request(method, path, data=None):
+    response = wsgi_client.open(path, method=method, data=data)
+    return response.status_code, response.headers, response.data
+
+  pages = [
+    '/venues', '/venues?genres=Jazz', '/venues/search?search_term=Hop', '/venues/%d' % venue_id, '/venues/999',
+    '/artists', '/artists?genres=Jazz&match=all', '/artists/search?search_term=Sax', '/artists/%d' % artist_id,
+    '/artists/999', '/shows', '/shows?after=not-a-cursor',
+  ]
+  for path in pages:
+    detail_cache.delete('venue:%d' % venue_id, 'artist:%d' % artist_id)
+    wsgi_status, _, wsgi_body = wsgi_request('GET', path)
+    asgi_status, _, asgi_body = asgi_request('GET', path)
+    check('{} answers {} on both ({})'.format(path, wsgi_status, asgi_status), wsgi_status == asgi_status)
+    check('{} has the same body on both'.format(path), wsgi_body == asgi_body)
+
+  # the edit is handled by the WSGI app either way, the redirect target by each app
+  bodies = {}
+  for name, send in (('wsgi', wsgi_request), ('asgi', asgi_request)):
+    form = send('GET', '/venues/create')[2].decode()
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', form).group(1)
+    path = '/venues/%d' % venue_id
+    send('POST', path + '/edit', {
+      'csrf_token': token, 'name': 'The Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main Street',
+      'phone': '4155550123', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/hop',
+      'website_link': 'https://example.com/hop'})
+    _, headers, body = send('GET', path)
+    check('{} shows the flashed message after the edit'.format(name), FLASH in body)
+    check('{} updates the session cookie'.format(name), 'Set-Cookie' in headers)
+    _, _, again = send('GET', path)
+    check('{} shows the flashed message once'.format(name), FLASH not in again)
+    bodies[name] = body
+  check('the flashed page has the same body on both', bodies['wsgi'] == bodies['asgi'])
+
+  loop.run_until_complete(asgi_client.aclose())
+  sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+  main()
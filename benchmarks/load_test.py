@@ -0,0 +1,91 @@
+"""Throughput of the read pages under concurrent load, WSGI against ASGI.
+
+  python benchmarks/synthetic.py postgresql://localhost:5432/spotlight_bench --shows 100000 --reset
+  DATABASE_URL=postgresql://localhost:5432/spotlight_bench SPOTLIGHT_ENV=production SECRET_KEY=bench \\
+      gunicorn app:app --workers 4 --bind 127.0.0.1:8000
+  DATABASE_URL=postgresql://localhost:5432/spotlight_bench SPOTLIGHT_ENV=production SECRET_KEY=bench \\
+      uvicorn asgi:asgi_app --workers 4 --port 8001
+  python benchmarks/load_test.py wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001 \\
+      --concurrency 10 100 500 --duration 20
+
+Keeps --concurrency requests in flight against each target for --duration seconds,
+spread over the venue and artist listings, their search pages, the venue and artist
+pages and /shows, and prints requests per second, p50/p95/p99 latency and errors per
+target and concurrency. Detail pages pick ids up to --venues and --artists (synthetic.py
+makes one venue per 20 shows and one artist per 10). Give both servers the same number of
+workers and the same pool settings, and run this from another machine or with the
+servers pinned to their own cores, or the client competes with them for CPU.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+TERMS = ['Hop', 'music', 'velvet lounge', 'Austin', 'band']
+
+def request_paths(args, rnd):
+  # the mix of read pages one simulated user goes through
+  while True:
+    yield '/venues'
+    yield '/venues/%d' % rnd.randint(1, args.venues)
+    yield '/artists'
+    yield '/artists/%d' % rnd.randint(1, args.artists)
+    yield '/venues/search?search_term=%s' % rnd.choice(TERMS)
+    yield '/artists/search?search_term=%s' % rnd.choice(TERMS)
+    yield '/shows'
+
+async def user(client, args, seed, deadline, latencies, errors):
+  paths = request_paths(args, random.Random(seed))
+  while time.perf_counter() < deadline:
+    path = next(paths)
+    start = time.perf_counter()
+    try:
+      response = await client.get(path)
+      ok = response.status_code < 500
+    except httpx.HTTPError:
+      ok = False
+    if ok:
+      latencies.append(time.perf_counter() - start)
+    else:
+      errors.append(path)
+
+async def load(url, concurrency, args):
+  latencies, errors = [], []
+  limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+  async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+    # one request first so the servers have their pools warm
+    await client.get('/venues')
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[user(client, args, n, deadline, latencies, errors) for n in range(concurrency)])
+    elapsed = time.perf_counter() - start
+  return latencies, errors, elapsed
+
+def percentile(values, p):
+  return statistics.quantiles(values, n=100)[p - 1] if len(values) > 1 else (values[0] if values else 0.0)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('targets', nargs='+', metavar='NAME=URL')
+  parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 500])
+  parser.add_argument('--duration', type=float, default=20.0)
+  parser.add_argument('--timeout', type=float, default=30.0)
+  parser.add_argument('--venues', type=int, default=100)
+  parser.add_argument('--artists', type=int, default=200)
+  args = parser.parse_args()
+  targets = [target.split('=', 1) if '=' in target else (target, target) for target in args.targets]
+
+  print('%-10s %6s %9s %9s %9s %9s %7s' % ('target', 'users', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+  for concurrency in args.concurrency:
+    for name, url in targets:
+      latencies, errors, elapsed = asyncio.run(load(url, concurrency, args))
+      print('%-10s %6d %9.1f %9.1f %9.1f %9.1f %7d' % (
+        name, concurrency, len(latencies) / elapsed, percentile(latencies, 50) * 1000,
+        percentile(latencies, 95) * 1000, percentile(latencies, 99) * 1000, len(errors)))
+
+if __name__ == '__main__':
+  main()
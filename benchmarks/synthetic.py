@@ -0,0 +1,128 @@
+"""Seeded synthetic Venue, Artist and Shows data at a configurable scale.
+
+  python benchmarks/synthetic.py postgresql://localhost:5432/spotlight_bench --shows 100000 --reset
+
+Creates one venue per 20 shows and one artist per 10 shows. Show counts per venue and
+artist are skewed, so some detail pages are much busier than others, and start times
+fall within a year either side of today, about half upcoming. The same --seed gives the
+same rows on the same day. --reset drops and recreates the tables first, so only point
+it at a scratch database.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forms import VenueForm
+from models import db, Venue, Artist, Shows, reconcile_upcoming_counts
+
+STATES = [value for value, label in VenueForm.state.kwargs['choices']]
+GENRES = [value for value, label in VenueForm.genres.kwargs['choices']]
+WORDS = ['The', 'Blue', 'Velvet', 'Musical', 'Hop', 'Dueling', 'Pianos', 'Park', 'Square',
+         'Live', 'Coffee', 'Wild', 'Sax', 'Band', 'Guns', 'Petals', 'Electric', 'Garden',
+         'Lounge', 'Hall', 'Room', 'Cellar', 'Quartet', 'Collective']
+CITIES = ['Springfield', 'Riverside', 'Fairview', 'Franklin', 'Greenville', 'Bristol',
+          'Clinton', 'Madison', 'Georgetown', 'Salem', 'Arlington', 'Ashland']
+
+# rows per COPY chunk, keeps memory flat at a million shows
+CHUNK_ROWS = 50000
+
+def scale(shows):
+  # venues and artists for a given number of shows
+  return max(10, shows // 20), max(10, shows // 10)
+
+def copy_value(value):
+  if value is None:
+    return '\\N'
+  if isinstance(value, bool):
+    return 't' if value else 'f'
+  if isinstance(value, list):
+    return '{' + ','.join('"%s"' % item for item in value) + '}'
+  return str(value)
+
+def copy_rows(table, columns, rows):
+  # COPY in chunks through the session's connection, much faster than INSERTs at scale
+  cursor = db.session.connection().connection.cursor()
+  buffer = io.StringIO()
+  def flush():
+    buffer.seek(0)
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN'.format(table, ', '.join(columns)), buffer)
+    buffer.seek(0)
+    buffer.truncate()
+  for count, row in enumerate(rows, 1):
+    buffer.write('\t'.join(copy_value(value) for value in row) + '\n')
+    if count % CHUNK_ROWS == 0:
+      flush()
+  flush()
+
+def listing(rng, kind, i):
+  name = '{} {} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(WORDS), i)
+  genres = sorted(rng.sample(GENRES, rng.randint(1, 3)))
+  return [
+    name, rng.choice(CITIES), rng.choice(STATES), '415555{:04d}'.format(i % 10000), genres,
+    'https://picsum.photos/seed/{}{}/300'.format(kind, i),
+    'https://www.facebook.com/{}{}'.format(kind, i),
+    'https://example.com/{}{}'.format(kind, i),
+    rng.random() < 0.3,
+    None
+  ]
+
+def generate(shows, seed=0, reset=False):
+  # fills an empty database, or with reset the recreated tables. needs an app context
+  if reset:
+    db.drop_all()
+    db.create_all()
+  elif db.session.query(Venue.id).first() or db.session.query(Artist.id).first():
+    raise RuntimeError('the database already has venues or artists, generate with reset=True')
+  rng = random.Random(seed)
+  venues, artists = scale(shows)
+  columns = ['name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website']
+  copy_rows('Venue', columns + ['seeking_talent', 'seeking_description', 'address'],
+            (listing(rng, 'venue', i) + ['{} Main Street'.format(i)] for i in range(venues)))
+  copy_rows('Artist', columns + ['seeking_venue', 'seeking_description'],
+            (listing(rng, 'artist', i) for i in range(artists)))
+  venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+  artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+  today = datetime.combine(datetime.now().date(), datetime.min.time())
+  def show(i):
+    # squaring the uniform draw gives low ids most of the shows
+    venue = venue_ids[int(len(venue_ids) * rng.random() ** 2)]
+    artist = artist_ids[int(len(artist_ids) * rng.random() ** 2)]
+    start_time = today + timedelta(days=rng.randint(-365, 365), hours=rng.choice([18, 19, 20, 21, 22]),
+                                   minutes=rng.choice([0, 30]))
+    return [venue, artist, start_time]
+  copy_rows('Shows', ['venue_id', 'artist_id', 'start_time'], (show(i) for i in range(shows)))
+  db.session.commit()
+  # COPY skips the ORM events that keep the counters
+  reconcile_upcoming_counts()
+  for model in (Venue, Artist, Shows):
+    db.session.execute(db.text('ANALYZE "{}"'.format(model.__table__.name)))
+  db.session.commit()
+  return venues, artists, shows
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('database_url')
+  parser.add_argument('--shows', type=int, default=10000, help='1000 to 1000000 are sensible')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--reset', action='store_true', help='drop and recreate the tables first')
+  args = parser.parse_args()
+
+  from app import app
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    started = time.perf_counter()
+    try:
+      venues, artists, shows = generate(args.shows, args.seed, args.reset)
+    except RuntimeError as e:
+      sys.exit(str(e))
+    print('{} venues, {} artists, {} shows in {:.1f}s'.format(venues, artists, shows, time.perf_counter() - started))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,119 @@
+from bisect import bisect_left, insort
+from datetime import timedelta
+from sqlalchemy import Integer, DateTime, column, bindparam, literal, func, union_all, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from models import db, Shows, show_period
+
+#----------------------------------------------------------------------------#
+# Booking conflicts.
+#----------------------------------------------------------------------------#
+
+# a proposed show conflicts with a booked show at the same venue or with the same artist
+# whose [start, end) period overlaps its own. the booked side is looked up through the
+# GiST indexes on (venue_id, period) and (artist_id, period), so each check reads only the
+# overlapping shows of that venue or artist, and any number of proposed shows is checked
+# in one statement.
+
+def end_time(proposed):
+  return proposed['start_time'] + timedelta(minutes=proposed['duration_minutes'])
+
+def booked_conflicts(proposed):
+  # conflicts of the proposed shows (dicts with venue_id, artist_id, start_time and
+  # duration_minutes) with the shows already in the database. the batch goes in as one
+  # array per column, unnested in SQL, so the statement is the same for every batch size
+  # and compiles once
+  if not proposed:
+    return []
+  def array(name, item_type, values):
+    return bindparam(name, values, type_=ARRAY(item_type))
+  rows = func.unnest(
+    array('positions', Integer, list(range(len(proposed)))),
+    array('venue_ids', Integer, [show['venue_id'] for show in proposed]),
+    array('artist_ids', Integer, [show['artist_id'] for show in proposed]),
+    array('start_times', DateTime, [show['start_time'] for show in proposed]),
+    array('end_times', DateTime, [end_time(show) for show in proposed]),
+  ).table_valued(
+    column('position', Integer), column('venue_id', Integer), column('artist_id', Integer),
+    column('start_time', DateTime), column('end_time', DateTime), name='proposed'
+  ).render_derived()
+  period = func.tsrange(rows.c.start_time, rows.c.end_time)
+  def on(kind, key):
+    # int4range(id, id, '[]') @> id is the spelling of id = id the GiST index can serve
+    # without btree_gist
+    booked = func.int4range(getattr(Shows, key), getattr(Shows, key), '[]')
+    return select(rows.c.position, literal(kind).label('on'), Shows.id.label('show_id'),
+                  Shows.start_time, Shows.duration_minutes) \
+      .join_from(rows, Shows, booked.op('@>')(getattr(rows.c, key)) & show_period(Shows).op('&&')(period))
+  statement = union_all(on('venue', 'venue_id'), on('artist', 'artist_id'))
+  return [{
+    'position': row.position,
+    'on': row.on,
+    'show_id': row.show_id,
+    'other_position': None,
+    'start_time': row.start_time,
+    'end_time': row.start_time + timedelta(minutes=row.duration_minutes),
+  } for row in db.session.execute(statement.order_by('position', 'show_id'))]
+
+def batch_conflicts(proposed):
+  # conflicts among the proposed shows themselves, taken in order: a show conflicts when
+  # it overlaps an earlier one that did not. the accepted periods of each venue and
+  # artist never overlap, so sorted by start only the two neighbours of a new period can
+  # overlap it
+  accepted = {}
+  conflicts = []
+  for position, show in enumerate(proposed):
+    start, end = show['start_time'], end_time(show)
+    found = []
+    for kind, key in (('venue', 'venue_id'), ('artist', 'artist_id')):
+      periods = accepted.get((kind, show[key]), [])
+      index = bisect_left(periods, (start,))
+      for other_start, other_end, other_position in periods[max(0, index - 1):index + 1]:
+        if other_start < end and other_end > start:
+          found.append({
+            'position': position,
+            'on': kind,
+            'show_id': None,
+            'other_position': other_position,
+            'start_time': other_start,
+            'end_time': other_end,
+          })
+          break
+    if found:
+      conflicts.extend(found)
+    else:
+      for kind, key in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        insort(accepted.setdefault((kind, show[key]), []), (start, end, position))
+  return conflicts
+
+def find_conflicts(proposed):
+  # every conflict of the proposed shows, ordered by position. a show that conflicts with
+  # a booked one does not also count against the later shows of the batch
+  booked = booked_conflicts(proposed)
+  rejected = {conflict['position'] for conflict in booked}
+  free = [position for position in range(len(proposed)) if position not in rejected]
+  within = batch_conflicts([proposed[position] for position in free])
+  for conflict in within:
+    conflict['position'] = free[conflict['position']]
+    conflict['other_position'] = free[conflict['other_position']]
+  return sorted(booked + within, key=lambda conflict: conflict['position'])
+
+def lock_bookings(proposed):
+  # serializes checks of the same venue or artist until the transaction ends, so two
+  # requests can not both find a slot free and book it. locks are taken in id order
+  venue_ids = sorted({show['venue_id'] for show in proposed})
+  artist_ids = sorted({show['artist_id'] for show in proposed})
+  for namespace, ids in ((1, venue_ids), (2, artist_ids)):
+    if ids:
+      db.session.execute(db.text(
+        'SELECT pg_advisory_xact_lock(:namespace, id) FROM unnest(CAST(:ids AS integer[])) AS id ORDER BY id'
+      ), {'namespace': namespace, 'ids': ids})
+
+def describe_conflict(conflict, lines=None):
+  # lines maps positions to what the caller calls them, e.g. the line numbers of a file
+  if conflict['show_id'] is not None:
+    booked = 'show {}'.format(conflict['show_id'])
+  else:
+    other = conflict['other_position']
+    booked = 'line {}'.format(lines[other]) if lines else 'proposed show {}'.format(other + 1)
+  return 'the {} is already booked from {:%Y-%m-%d %H:%M} to {:%Y-%m-%d %H:%M} ({})'.format(
+    conflict['on'], conflict['start_time'], conflict['end_time'], booked)
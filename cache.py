@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUCache(object):
+  # in-process cache, least recently used entries are evicted past max_entries and
+  # entries expire after their timeout. each worker process has its own.
+
+  def __init__(self, max_entries=1024, default_timeout=300):
+    self.max_entries = max_entries
+    self.default_timeout = default_timeout
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires_at, value = entry
+      if expires_at <= time.monotonic():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, timeout=None):
+    timeout = self.default_timeout if timeout is None else timeout
+    with self._lock:
+      self._entries[key] = (time.monotonic() + timeout, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def delete(self, *keys):
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+
+class RedisCache(object):
+  # cache shared by all workers in a Redis-compatible server. values are stored as json,
+  # so they must be plain dicts, lists, strings and numbers
+
+  def __init__(self, url, default_timeout=300, prefix='spotlight:'):
+    try:
+      import redis
+    except ImportError:
+      raise RuntimeError("CACHE_TYPE = 'redis' needs the redis package, pip install redis")
+    self.default_timeout = default_timeout
+    self.prefix = prefix
+    self._client = redis.Redis.from_url(url)
+
+  def get(self, key):
+    value = self._client.get(self.prefix + key)
+    return None if value is None else json.loads(value)
+
+  def set(self, key, value, timeout=None):
+    timeout = self.default_timeout if timeout is None else timeout
+    self._client.set(self.prefix + key, json.dumps(value), px=max(1, int(timeout * 1000)))
+
+  def delete(self, *keys):
+    if keys:
+      self._client.delete(*[self.prefix + key for key in keys])
+
+#----------------------------------------------------------------------------#
+# Read-through cache.
+#----------------------------------------------------------------------------#
+
+class PageCache(object):
+  # read-through cache for assembled page data with hit and miss counters. each value is
+  # stored with a version, e.g. the ETag of the page it was built for, and an entry of
+  # another version counts as a miss. a worker whose copy predates a write made through
+  # another worker then rebuilds it instead of sending it under the new ETag
+
+  def __init__(self, backend):
+    self.backend = backend
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def _get(self, key, version):
+    entry = self.backend.get(key)
+    value = entry[1] if entry is not None and entry[0] == version else None
+    with self._lock:
+      if value is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    return value
+
+  def _set(self, key, value, timeout, version):
+    if value is not None:
+      self.backend.set(key, [version, value], timeout(value) if callable(timeout) else timeout)
+
+  def get_or_set(self, key, build, timeout=None, version=None):
+    # build() returns the value to cache, None is returned as is and never cached.
+    # timeout may be a function of the built value, for entries that go stale at a
+    # known time
+    value = self._get(key, version)
+    if value is None:
+      value = build()
+      self._set(key, value, timeout, version)
+    return value
+
+  async def get_or_set_async(self, key, build, timeout=None, version=None):
+    # get_or_set for the async read path, build is a coroutine function
+    value = self._get(key, version)
+    if value is None:
+      value = await build()
+      self._set(key, value, timeout, version)
+    return value
+
+  def delete(self, *keys):
+    self.backend.delete(*keys)
+
+  def stats(self):
+    with self._lock:
+      hits, misses = self.hits, self.misses
+    return {
+      'backend': type(self.backend).__name__,
+      'hits': hits,
+      'misses': misses,
+      'hit_ratio': hits / (hits + misses) if hits + misses else None
+    }
+
+def make_cache(config):
+  if config.get('CACHE_TYPE', 'lru') == 'redis':
+    backend = RedisCache(config['CACHE_REDIS_URL'], config.get('CACHE_DEFAULT_TIMEOUT', 300))
+  else:
+    backend = LRUCache(config.get('CACHE_MAX_ENTRIES', 1024), config.get('CACHE_DEFAULT_TIMEOUT', 300))
+  return PageCache(backend)
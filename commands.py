@@ -0,0 +1,72 @@
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models import reconcile_upcoming_counts
+from importer import read_rows, import_rows
+from assets import build
+
+# maintenance commands, run as `flask spotlight <command>`
+spotlight_cli = AppGroup('spotlight', help='Spotlight maintenance commands.')
+
+@spotlight_cli.command('reconcile-counts')
+def reconcile_counts_command():
+  """Recompute the upcoming show counters on venues and artists.
+
+  Shows move from upcoming to past as time passes, run this periodically (e.g. from
+  cron every few minutes) to keep the counters on the listing pages current.
+  """
+  venues, artists = reconcile_upcoming_counts()
+  click.echo('updated {} venues and {} artists'.format(venues, artists))
+
+@spotlight_cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='File format, taken from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT and transaction.')
+@click.option('--upsert', is_flag=True, help='Update venues and artists whose name already exists.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Also write rejected rows to this file, one json object per line.')
+@click.option('--allow-conflicts', is_flag=True,
+              help='Write shows that overlap another show of the same venue or artist.')
+def import_command(kind, path, format, batch_size, upsert, errors_path, allow_conflicts):
+  """Bulk load venues, artists or shows from a CSV or NDJSON file.
+
+  Columns are the form field names (genres as a comma separated list in CSV). Shows
+  reference venues and artists by venue_id/artist_id or by venue_name/artist_name.
+  Rows are validated with the same forms as the create pages; rejected rows are
+  reported per batch and the rest of the batch is still written. Shows that overlap a
+  booked show or an earlier row at the same venue or with the same artist are rejected.
+  """
+  format = format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+  errors_file = open(errors_path, 'w') if errors_path else None
+  rows = written = rejected = 0
+  started = time.perf_counter()
+  with open(path, newline='' if format == 'csv' else None) as stream:
+    for report in import_rows(kind, read_rows(stream, format), batch_size, upsert, not allow_conflicts):
+      rows += report.rows
+      written += report.inserted + report.updated
+      rejected += len(report.errors)
+      click.echo('batch {} (lines {}-{}): {} inserted, {} updated, {} rejected'.format(
+        report.number, report.first_line, report.last_line, report.inserted, report.updated, len(report.errors)))
+      for line, message in report.errors:
+        click.echo('  line {}: {}'.format(line, message), err=True)
+        if errors_file:
+          errors_file.write(json.dumps({'batch': report.number, 'line': line, 'error': message}) + '\n')
+  if errors_file:
+    errors_file.close()
+  elapsed = time.perf_counter() - started
+  click.echo('{} rows in {:.2f}s ({:.0f} rows/s): {} written, {} rejected'.format(
+    rows, elapsed, rows / elapsed if elapsed else 0, written, rejected))
+
+@spotlight_cli.command('build-assets')
+def build_assets_command():
+  """Bundle, fingerprint and precompress the static files into static/dist.
+
+  Run it on every deploy, before the app starts. Until static/dist exists the pages
+  link the separate, unhashed files.
+  """
+  manifest = build(current_app.static_folder)
+  click.echo('built {} files and {} images'.format(len(manifest['files']), len(manifest['images'])))
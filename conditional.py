@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, session, g, abort, make_response, current_app
+from werkzeug.http import is_resource_modified
+from models import db, Venue, Artist, Shows, TableVersion
+from assets import DIST, MANIFEST
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# a page's validators, (etag, last_modified), come from one small query over the
+# updated_at columns and table versions of what the page shows. a request whose
+# If-None-Match or If-Modified-Since matches gets an empty 304 before anything else is
+# loaded or rendered
+
+def utc(value):
+  return value.replace(tzinfo=timezone.utc) if value else None
+
+def local(value):
+  # start times are naive local times, see the datetime.now() comparisons in app.py
+  return value.astimezone(timezone.utc) if value else None
+
+def code_version(app):
+  # the templates and modules that shape the pages and the asset manifest that names the
+  # stylesheets and scripts they link, so a deploy that changes the html or only the
+  # built assets changes every ETag and moves Last-Modified forward
+  digest, modified = hashlib.sha256(), 0
+  paths = [os.path.join(app.root_path, name) for name in sorted(os.listdir(app.root_path)) if name.endswith('.py')]
+  for root, dirs, names in os.walk(os.path.join(app.root_path, app.template_folder)):
+    dirs.sort()
+    paths += [os.path.join(root, name) for name in sorted(names)]
+  for path in paths:
+    with open(path, 'rb') as f:
+      digest.update(f.read())
+    modified = max(modified, os.path.getmtime(path))
+  digest.update(json.dumps(app.extensions['assets'], sort_keys=True).encode())
+  manifest_path = os.path.join(app.static_folder, DIST, MANIFEST)
+  if os.path.exists(manifest_path):
+    modified = max(modified, os.path.getmtime(manifest_path))
+  return digest.hexdigest()[:16], datetime.fromtimestamp(int(modified), timezone.utc)
+
+def validators(*parts, last_modified=()):
+  # the etag of a page from the values it depends on, and the newest of the times
+  code_hash, code_modified = current_app.extensions['conditional']
+  etag = hashlib.sha256(repr((code_hash,) + parts).encode()).hexdigest()[:32]
+  return etag, max([value for value in last_modified if value] + [code_modified])
+
+def venue_page_version_query(venue_id, now):
+  # a page changes with the venue, its shows, their artists, and whenever one of its
+  # upcoming shows starts. deleted shows change the count and touch the venue
+  return db.session.query(
+    Venue.updated_at,
+    db.func.count(Shows.id).label('shows'),
+    db.func.count(Shows.id).filter(Shows.start_time < now).label('past_shows'),
+    db.func.max(Shows.start_time).filter(Shows.start_time < now).label('last_started'),
+    db.func.max(Shows.updated_at).label('shows_updated_at'),
+    db.func.max(Artist.updated_at).label('related_updated_at'),
+  ).outerjoin(Shows, Shows.venue_id == Venue.id).outerjoin(Artist, Artist.id == Shows.artist_id) \
+    .filter(Venue.id == venue_id).group_by(Venue.id)
+
+def artist_page_version_query(artist_id, now):
+  return db.session.query(
+    Artist.updated_at,
+    db.func.count(Shows.id).label('shows'),
+    db.func.count(Shows.id).filter(Shows.start_time < now).label('past_shows'),
+    db.func.max(Shows.start_time).filter(Shows.start_time < now).label('last_started'),
+    db.func.max(Shows.updated_at).label('shows_updated_at'),
+    db.func.max(Venue.updated_at).label('related_updated_at'),
+  ).outerjoin(Shows, Shows.artist_id == Artist.id).outerjoin(Venue, Venue.id == Shows.venue_id) \
+    .filter(Artist.id == artist_id).group_by(Artist.id)
+
+def detail_validators(rows):
+  # None for a missing venue or artist
+  if not rows:
+    return None
+  row = rows[0]
+  return validators(
+    row.updated_at, row.shows, row.past_shows, row.shows_updated_at, row.related_updated_at,
+    last_modified=[utc(row.updated_at), utc(row.shows_updated_at), utc(row.related_updated_at), local(row.last_started)]
+  )
+
+def table_version_query(*tables):
+  return db.session.query(TableVersion.name, TableVersion.version, TableVersion.updated_at) \
+    .filter(TableVersion.name.in_(tables))
+
+def listing_validators(rows):
+  # a listing page changes with the tables it reads, whatever its cursor
+  versions = sorted((row.name, row.version) for row in rows)
+  return validators(*versions, last_modified=[utc(row.updated_at) for row in rows])
+
+def venue_page_validators(venue_id):
+  return detail_validators(venue_page_version_query(venue_id, datetime.now()).all())
+
+def artist_page_validators(artist_id):
+  return detail_validators(artist_page_version_query(artist_id, datetime.now()).all())
+
+def table_validators(*tables):
+  def page_validators(**view_args):
+    return listing_validators(table_version_query(*tables).all())
+  return page_validators
+
+def set_page_version(page_validators):
+  # the page's ETag, for the views to store their cached data under, see
+  # cache.PageCache. pages showing flashed messages are checked against it as well
+  g.page_version = page_validators[0] if page_validators else None
+
+def page_version():
+  return g.get('page_version')
+
+def has_flashes():
+  # a page showing flashed messages is for this request only, it gets no validators
+  return '_flashes' in session
+
+def not_modified(page_validators):
+  # the 304 for a request whose validators match page_validators, None when the page has
+  # to be rendered
+  if page_validators is None:
+    abort(404)
+  etag, last_modified = page_validators
+  if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+    return None
+  return add_validators(current_app.response_class(status=304), page_validators)
+
+def add_validators(response, page_validators):
+  etag, last_modified = page_validators
+  response.set_etag(etag, weak=True)
+  response.last_modified = last_modified
+  # caches may store the page, but have to check with us before every reuse
+  response.cache_control.no_cache = True
+  return response
+
+def conditional(get_validators):
+  # view decorator, get_validators(**view_args) returns the page's (etag, last_modified)
+  # or None for a missing resource, which answers 404
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**view_args):
+      page_validators = get_validators(**view_args)
+      set_page_version(page_validators)
+      if has_flashes():
+        return view(**view_args)
+      return not_modified(page_validators) or add_validators(make_response(view(**view_args)), page_validators)
+    return wrapper
+  return decorator
+
+def init_conditional(app):
+  # after init_assets, which loads the manifest
+  app.extensions['conditional'] = code_version(app)
@@ -1,13 +1,135 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+def postgresql_url(url):
+  # Heroku still hands out postgres:// urls, which SQLAlchemy 1.4 no longer accepts
+  return 'postgresql://' + url[len('postgres://'):] if url.startswith('postgres://') else url
 
-# Connect to the database
+def database_url(default):
+  return postgresql_url(os.environ.get('DATABASE_URL', default))
 
+def replica_binds(variable='REPLICA_DATABASE_URLS'):
+  # the binds of the read replicas of DATABASE_URL, a comma separated list in the variable
+  urls = [url.strip() for url in os.environ.get(variable, '').split(',') if url.strip()]
+  return {'replica%d' % n: postgresql_url(url) for n, url in enumerate(urls, 1)}
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://zherujiang@localhost:5432/spotlight'
+class Config(object):
+  # settings shared by every environment, SPOTLIGHT_ENV picks one of the classes below
+  SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+  DEBUG = False
+  TESTING = False
+
+  # Connect to the database
+  SQLALCHEMY_DATABASE_URI = database_url('postgresql://zherujiang@localhost:5432/spotlight')
+  SQLALCHEMY_TRACK_MODIFICATIONS = False
+  SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO') == '1'
+
+  # Read replicas: GET requests read from a random bind in DB_REPLICA_BINDS, except the
+  # DB_PRIMARY_ENDPOINTS and requests from a user who wrote within
+  # DB_READ_YOUR_WRITES_SECONDS. keep that window above the usual replication lag. pages
+  # built from a lagging replica right after someone else's write can stay in the page
+  # cache until CACHE_DEFAULT_TIMEOUT
+  SQLALCHEMY_BINDS = replica_binds()
+  DB_REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+  DB_PRIMARY_ENDPOINTS = ['delete_venue', 'delete_artist']
+  DB_READ_YOUR_WRITES_SECONDS = 10
+
+  # Connection pool, per worker process. size it so that workers * (DB_POOL_SIZE +
+  # DB_MAX_OVERFLOW) stays below the server's max_connections. pre-ping checks a connection
+  # before handing it out (one round trip), recycle replaces connections older than that
+  # many seconds, and statements running longer than DB_STATEMENT_TIMEOUT_MS are cancelled
+  # by the server (None for no limit)
+  DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+  DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+  DB_POOL_TIMEOUT = 30
+  DB_POOL_PRE_PING = False
+  DB_POOL_RECYCLE = -1
+  DB_STATEMENT_TIMEOUT_MS = None
+
+  # Connection pool of the async read path in asgi.py, per worker process, next to the
+  # pool above that the requests handed to the Flask app use. an async request holds one
+  # connection from its first statement to its response. the in-flight requests beyond
+  # the pool wait for a connection for up to DB_POOL_TIMEOUT, which costs a coroutine
+  # next to nothing, so size the pool for what the database serves well at once rather
+  # than for the number of clients. overflow connections are opened and closed per
+  # request under sustained load, hence none by default. count both pools against
+  # max_connections
+  ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+  ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 0))
+
+  # Cache for assembled venue and artist pages, 'lru' keeps it in each worker process,
+  # 'redis' shares it between workers through CACHE_REDIS_URL
+  CACHE_TYPE = os.environ.get('CACHE_TYPE', 'lru')
+  CACHE_DEFAULT_TIMEOUT = 300
+  CACHE_MAX_ENTRIES = 1024
+  CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+  # Time zone the datetime filter shows start times in, e.g. 'America/Los_Angeles'.
+  # None shows them as stored, otherwise stored times are taken as the server's local time
+  DISPLAY_TIMEZONE = None
+
+  # SQL statistics per request: statements slower than SQL_SLOW_QUERY_MS and query shapes
+  # repeated SQL_REPEAT_THRESHOLD times in one request (likely N+1) are logged as warnings.
+  # SQL_STATS_HEADERS adds X-DB-Queries and X-DB-Time to responses, keep it off in production
+  SQL_SLOW_QUERY_MS = 100
+  SQL_REPEAT_THRESHOLD = 5
+  SQL_STATS_HEADERS = False
+
+  # Profiling: requests carrying PROFILE_TOKEN in an X-Profile header or a profile= query
+  # argument run under cProfile (or the sampling profiler with profiler=sampling), None turns
+  # this off. PROFILE_SAMPLE_RATE of the requests to PROFILE_ENDPOINTS are profiled with
+  # PROFILE_SAMPLER regardless. Profiles go to PROFILE_DIR (instance/profiles by default),
+  # the newest PROFILE_KEEP are kept and listed at /profiles
+  PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+  PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+  PROFILE_ENDPOINTS = ['show_venue', 'show_artist', 'shows']
+  PROFILE_SAMPLER = 'sampling'
+  PROFILE_SAMPLE_INTERVAL = 0.005
+  PROFILE_DIR = None
+  PROFILE_KEEP = 200
+
+  # Static assets: files built by `flask spotlight build-assets` have their content hash in
+  # the name and are cached by browsers for ASSETS_MAX_AGE seconds
+  ASSETS_MAX_AGE = 365 * 24 * 3600
+
+class DevelopmentConfig(Config):
+  # Enable debug mode.
+  DEBUG = True
+  SQL_STATS_HEADERS = True
+
+class TestingConfig(Config):
+  TESTING = True
+  SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'postgresql://localhost:5432/spotlight_test')
+  SQL_STATS_HEADERS = True
+  # TEST_REPLICA_DATABASE_URL is a second scratch database that stands in for a replica.
+  # reads only go to it in the tests that switch DB_REPLICA_BINDS on
+  SQLALCHEMY_BINDS = replica_binds('TEST_REPLICA_DATABASE_URL')
+  DB_REPLICA_BINDS = []
+  DB_POOL_SIZE = 2
+  DB_MAX_OVERFLOW = 2
+  ASYNC_DB_POOL_SIZE = 2
+  ASYNC_DB_MAX_OVERFLOW = 2
+
+class ProductionConfig(Config):
+  # the secret key has to come from the environment, a random one per process would make
+  # sessions and CSRF tokens valid on one worker only
+  SECRET_KEY = os.environ.get('SECRET_KEY')
+  DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+  DB_POOL_TIMEOUT = 10
+  DB_POOL_PRE_PING = True
+  DB_POOL_RECYCLE = 1800
+  DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 10000))
+
+CONFIGS = {
+  'development': DevelopmentConfig,
+  'testing': TestingConfig,
+  'production': ProductionConfig,
+}
+
+def config_for(environment=None):
+  # the config object for an environment name, SPOTLIGHT_ENV by default
+  environment = environment or os.environ.get('SPOTLIGHT_ENV', 'development')
+  if environment not in CONFIGS:
+    raise RuntimeError('SPOTLIGHT_ENV must be one of {}, not {!r}'.format(', '.join(CONFIGS), environment))
+  return CONFIGS[environment]
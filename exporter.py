@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+from models import db, Venue, Artist, Shows
+
+# rows fetched per round trip from the server-side cursor, and per chunk written out
+CHUNK_SIZE = 1000
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# the columns are named after the form fields, so an export can be loaded again with
+# `flask spotlight import`
+EXPORTS = {
+  'venues': lambda: db.session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone, Venue.genres,
+    Venue.image_link, Venue.facebook_link, Venue.website.label('website_link'),
+    Venue.seeking_talent, Venue.seeking_description
+  ).order_by(Venue.id),
+  'artists': lambda: db.session.query(
+    Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres,
+    Artist.image_link, Artist.facebook_link, Artist.website.label('website_link'),
+    Artist.seeking_venue, Artist.seeking_description
+  ).order_by(Artist.id),
+  'shows': lambda: db.session.query(
+    Shows.id, Shows.venue_id, Venue.name.label('venue_name'),
+    Shows.artist_id, Artist.name.label('artist_name'), Shows.start_time, Shows.duration_minutes
+  ).join(Venue, Shows.venue_id == Venue.id).join(Artist, Shows.artist_id == Artist.id).order_by(Shows.id),
+}
+
+ID_COLUMNS = {'venues': Venue.id, 'artists': Artist.id, 'shows': Shows.id}
+
+def export_query(kind, since=None):
+  # since is the last id of a previous export, only rows added after it are exported
+  query = EXPORTS[kind]()
+  if since is not None:
+    query = query.filter(ID_COLUMNS[kind] > since)
+  # yield_per streams from a server-side cursor instead of loading the whole result
+  return query.yield_per(CHUNK_SIZE)
+
+#----------------------------------------------------------------------------#
+# Writers.
+#----------------------------------------------------------------------------#
+
+def plain(value):
+  if isinstance(value, list):
+    return value
+  if hasattr(value, 'isoformat'):
+    # the format ShowForm reads back
+    return str(value)
+  return value
+
+def csv_value(value):
+  if isinstance(value, list):
+    return ','.join(value)
+  if isinstance(value, bool):
+    return 'true' if value else 'false'
+  return plain(value)
+
+def csv_chunks(query):
+  # header first, then CHUNK_SIZE rows per chunk so the response is not written a row at a time
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow([column['name'] for column in query.column_descriptions])
+  count = 0
+  for row in query:
+    writer.writerow([csv_value(value) for value in row])
+    count += 1
+    if count % CHUNK_SIZE == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  yield buffer.getvalue()
+
+def ndjson_chunks(query):
+  names = [column['name'] for column in query.column_descriptions]
+  lines = []
+  for row in query:
+    lines.append(json.dumps({name: plain(value) for name, value in zip(names, row)}) + '\n')
+    if len(lines) == CHUNK_SIZE:
+      yield ''.join(lines)
+      lines = []
+  if lines:
+    yield ''.join(lines)
+
+WRITERS = {
+  'csv': (csv_chunks, 'text/csv'),
+  'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
@@ -1,3 +1,4 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -5,10 +6,18 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # the test suite against TEST_DATABASE_URL, then the route benchmark against a scratch
+    # database, which fails on regressions against the saved baseline when there is one
+    database_url = os.environ.get("BENCHMARK_DATABASE_URL")
+    if not os.environ.get("TEST_DATABASE_URL") or not database_url:
+        abort("Set TEST_DATABASE_URL and BENCHMARK_DATABASE_URL to scratch databases, they are dropped and reseeded.")
+    command = "python benchmarks/bench_routes.py {} --output benchmarks/results.json".format(database_url)
+    if os.path.exists("benchmarks/baseline.json"):
+        command += " --baseline benchmarks/baseline.json"
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest tests", capture=True)
+        if result.succeeded:
+            result = local(command, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +48,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # the benchmark reseeds its database, so only check that the deployed app imports
+    local("heroku run python -c 'import app'")
 
 
 def deploy():
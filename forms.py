@@ -1,22 +1,19 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, DateField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, NumberRange, Optional
 import phonenumbers
 
 def phone_validator(form, field):
-    # print('validating')
     if len(field.data) > 16:
         raise ValidationError('Invalid phone number.')
     try:
         input_number = phonenumbers.parse(field.data)
         if not (phonenumbers.is_valid_number(input_number)):
-            print('invalid')
             raise ValidationError('Invalid phone number.')
     except:
         input_number = phonenumbers.parse("+1"+field.data)
         if not (phonenumbers.is_valid_number(input_number)):
-            print('invalid')
             raise ValidationError('Invalid phone number.')
             
 class ShowForm(Form):
@@ -31,6 +28,36 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
+    # a weekly or monthly series of shows, ending on a date or after a number of shows
+    repeat = SelectField(
+        'repeat',
+        choices=[('', 'Does not repeat'), ('weekly', 'Weekly'), ('monthly', 'Monthly')],
+        default=''
+    )
+    repeat_interval = IntegerField(
+        'repeat_interval',
+        validators=[Optional(), NumberRange(min=1, max=12)],
+        default=1
+    )
+    repeat_until = DateField(
+        'repeat_until',
+        validators=[Optional()]
+    )
+    repeat_count = IntegerField(
+        'repeat_count',
+        validators=[Optional(), NumberRange(min=2, max=104)]
+    )
+
+    def validate_repeat(self, field):
+        if field.data and not (self.repeat_until.data or self.repeat_count.data):
+            raise ValidationError('A repeating show needs an end date or a number of shows.')
+        if field.data and self.repeat_until.data and self.start_time.data and self.repeat_until.data < self.start_time.data.date():
+            raise ValidationError('The series has to end after its first show.')
 
 class VenueForm(Form):
     name = StringField(
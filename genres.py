@@ -0,0 +1,65 @@
+from flask import request, abort, url_for
+from sqlalchemy import func, column
+from sqlalchemy.dialects.postgresql import array
+from models import db
+from forms import VenueForm
+
+GENRES = [value for value, label in VenueForm.genres.kwargs['choices']]
+
+#----------------------------------------------------------------------------#
+# Genre filters.
+#----------------------------------------------------------------------------#
+
+# ?genre=Jazz&genre=Blues keeps the rows with any of the genres, adding &match=all keeps
+# the rows with all of them. both are array operators the GIN index on genres serves
+# (&& and @>), unlike `'Jazz' = ANY(genres)`, which scans every row
+
+MATCH_MODES = ('any', 'all')
+
+def request_genre_filter():
+  # (genres, match) from the current request, aborting with 400 on bad input
+  genres = sorted(set(request.args.getlist('genre')))
+  match = request.args.get('match', 'any')
+  if match not in MATCH_MODES or len(genres) > len(GENRES):
+    abort(400)
+  return genres, match
+
+def genre_condition(model, genres, match):
+  # the columns are the generic db.ARRAY, which has no overlap/contains, so the operators
+  # are spelled out. the cast makes the parameters varchar[] like the column, && and @>
+  # are not defined between varchar[] and text[]
+  selected = db.cast(array(genres), model.genres.type)
+  return model.genres.op('&&' if match == 'any' else '@>')(selected)
+
+def filter_by_genres(query, model, genres, match):
+  return query.filter(genre_condition(model, genres, match)) if genres else query
+
+def facet_query(model, genres, match):
+  # how many of the filtered rows have each genre, in one aggregate over the unnested arrays
+  genre = func.unnest(model.genres).table_valued(column('genre', db.String)).render_derived()
+  query = db.session.query(genre.c.genre, func.count().label('count')).select_from(model).join(genre, db.true())
+  return filter_by_genres(query, model, genres, match).group_by(genre.c.genre)
+
+def genre_facets(rows, genres, match):
+  # one entry per genre with rows, most common first. url toggles the genre in the
+  # current filter and starts again from the first page
+  facets = []
+  for genre, count in sorted(rows, key=lambda row: (-row.count, row.genre)):
+    toggled = [g for g in genres if g != genre] if genre in genres else genres + [genre]
+    facets.append({
+      'genre': genre,
+      'count': count,
+      'selected': genre in genres,
+      'url': url_for(request.endpoint, genre=sorted(toggled), match=match if len(toggled) > 1 else None),
+    })
+  return {
+    'genres': genres,
+    'match': match,
+    'facets': facets,
+    'match_urls': {mode: url_for(request.endpoint, genre=genres, match=mode) for mode in MATCH_MODES},
+    'clear_url': url_for(request.endpoint),
+  }
+
+def genre_link_args(genres, match):
+  # keeps the filter on the pager links
+  return {'genre': genres, 'match': match} if genres else {}
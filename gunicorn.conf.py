@@ -0,0 +1,7 @@
+# gunicorn picks this file up from the working directory.
+# with PROMETHEUS_MULTIPROC_DIR set, the files of a worker that exited have to be marked
+# dead so its in-progress gauge stops counting towards /metrics
+
+def child_exit(server, worker):
+  from prometheus_client import multiprocess
+  multiprocess.mark_process_dead(worker.pid)
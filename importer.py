@@ -0,0 +1,238 @@
+import csv
+import json
+from itertools import islice
+from werkzeug.datastructures import MultiDict
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Shows, UTC_NOW, DEFAULT_SHOW_MINUTES, reconcile_upcoming_counts
+from bookings import lock_bookings, find_conflicts, describe_conflict
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def read_rows(stream, format):
+  # yields (line number, row dict, error) one row at a time, so files of any size can be
+  # imported in constant memory
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, row, None
+  else:
+    for line_number, line in enumerate(stream, 1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError as e:
+        yield line_number, None, 'invalid json: {}'.format(e)
+        continue
+      if isinstance(row, dict):
+        yield line_number, row, None
+      else:
+        yield line_number, None, 'expected a json object'
+
+def form_data(row):
+  # turns a csv or json row into what the browser would have posted
+  data = MultiDict()
+  for key, value in row.items():
+    if value is None:
+      continue
+    if key == 'genres':
+      genres = value if isinstance(value, list) else value.split(',')
+      for genre in genres:
+        if genre.strip():
+          data.add('genres', genre.strip())
+    elif isinstance(value, bool):
+      data.add(key, 'y' if value else 'false')
+    else:
+      data.add(key, str(value))
+  return data
+
+#----------------------------------------------------------------------------#
+# Validation, with the same forms the create handlers use.
+#----------------------------------------------------------------------------#
+
+def venue_values(form):
+  return {
+    'name': form.name.data,
+    'city': form.city.data,
+    'state': form.state.data,
+    'address': form.address.data,
+    'phone': form.phone.data,
+    'genres': form.genres.data,
+    'image_link': form.image_link.data,
+    'facebook_link': form.facebook_link.data,
+    'website': form.website_link.data,
+    'seeking_talent': form.seeking_talent.data,
+    'seeking_description': form.seeking_description.data
+  }
+
+def artist_values(form):
+  return {
+    'name': form.name.data,
+    'city': form.city.data,
+    'state': form.state.data,
+    'phone': form.phone.data,
+    'genres': form.genres.data,
+    'image_link': form.image_link.data,
+    'facebook_link': form.facebook_link.data,
+    'website': form.website_link.data,
+    'seeking_venue': form.seeking_venue.data,
+    'seeking_description': form.seeking_description.data
+  }
+
+def show_values(form, row):
+  # venues and artists may be referenced by id or, for new listings, by name
+  return {
+    'venue_id': form.venue_id.data or None,
+    'artist_id': form.artist_id.data or None,
+    'venue_name': row.get('venue_name'),
+    'artist_name': row.get('artist_name'),
+    'start_time': form.start_time.data,
+    'duration_minutes': form.duration_minutes.data or DEFAULT_SHOW_MINUTES
+  }
+
+KINDS = {
+  'venues': (Venue, VenueForm, lambda form, row: venue_values(form)),
+  'artists': (Artist, ArtistForm, lambda form, row: artist_values(form)),
+  'shows': (Shows, ShowForm, show_values),
+}
+
+def validate(kind, row):
+  model, form_class, values = KINDS[kind]
+  if kind == 'shows' and not row.get('start_time'):
+    # ShowForm would fall back to its default of "now"
+    return None, 'start_time: This field is required.'
+  form = form_class(formdata=form_data(row), meta={'csrf': False})
+  if not form.validate():
+    return None, '; '.join('{}: {}'.format(field, ', '.join(messages)) for field, messages in form.errors.items())
+  return values(form, row), None
+
+#----------------------------------------------------------------------------#
+# Writing.
+#----------------------------------------------------------------------------#
+
+class BatchReport(object):
+  def __init__(self, number, first_line, last_line):
+    self.number = number
+    self.first_line = first_line
+    self.last_line = last_line
+    self.rows = 0
+    self.inserted = 0
+    self.updated = 0
+    self.errors = []
+
+def resolve_show_references(pending, report):
+  # one query per referenced table for the whole batch instead of a get() per row
+  for model, id_key, name_key in ((Venue, 'venue_id', 'venue_name'), (Artist, 'artist_id', 'artist_name')):
+    names = {values[name_key] for line, values in pending if not values[id_key] and values[name_key]}
+    ids = {int(values[id_key]) for line, values in pending if str(values[id_key] or '').isdigit()}
+    by_name = dict(db.session.query(model.name, model.id).filter(model.name.in_(names))) if names else {}
+    known_ids = {id for id, in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+    resolved = []
+    for line, values in pending:
+      if values[id_key]:
+        entity_id = int(values[id_key]) if str(values[id_key]).isdigit() else None
+        if entity_id not in known_ids:
+          report.errors.append((line, '{}: no {} with id {}'.format(id_key, model.__tablename__, values[id_key])))
+          continue
+      elif values[name_key] in by_name:
+        entity_id = by_name[values[name_key]]
+      else:
+        report.errors.append((line, '{}: no {} named {!r}'.format(name_key, model.__tablename__, values[name_key])))
+        continue
+      values[id_key] = entity_id
+      resolved.append((line, values))
+    pending = resolved
+  return [(line, {key: values[key] for key in ('venue_id', 'artist_id', 'start_time', 'duration_minutes')})
+          for line, values in pending]
+
+def drop_conflicting_shows(pending, report):
+  # checks the whole batch against the booked shows and itself in one query, under
+  # locks on its venues and artists that are held until the batch commits
+  proposed = [values for line, values in pending]
+  lock_bookings(proposed)
+  lines = [line for line, values in pending]
+  conflicts = find_conflicts(proposed)
+  report.errors.extend((lines[conflict['position']], 'start_time: ' + describe_conflict(conflict, lines))
+                       for conflict in conflicts)
+  rejected = {conflict['position'] for conflict in conflicts}
+  return [entry for position, entry in enumerate(pending) if position not in rejected]
+
+def write_batch(kind, pending, upsert, report, check_conflicts=True):
+  model = KINDS[kind][0]
+  table = model.__table__
+  if kind == 'shows':
+    pending = resolve_show_references(pending, report)
+    if check_conflicts and pending:
+      pending = drop_conflicting_shows(pending, report)
+  else:
+    # a name can only be written once per statement, the last row for a name wins
+    last_line = {values['name']: line for line, values in pending}
+    for line, values in pending:
+      if last_line[values['name']] != line:
+        report.errors.append((line, 'name: {!r} appears again on line {}'.format(values['name'], last_line[values['name']])))
+    pending = [(line, values) for line, values in pending if last_line[values['name']] == line]
+  if not pending:
+    # ends the transaction of the conflict check and releases its locks
+    db.session.rollback()
+    return
+  # one multi-row INSERT per batch. xmax is 0 for freshly inserted rows, which tells
+  # inserts from upserted updates apart
+  statement = insert(table).values([values for line, values in pending])
+  if kind != 'shows':
+    if upsert:
+      statement = statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_=dict({key: statement.excluded[key] for key in pending[0][1] if key != 'name'}, updated_at=UTC_NOW)
+      )
+    else:
+      statement = statement.on_conflict_do_nothing(index_elements=['name'])
+    statement = statement.returning(table.c.name, literal_column('xmax = 0').label('inserted'))
+  else:
+    statement = statement.returning(table.c.id, literal_column('true').label('inserted'))
+  try:
+    written = db.session.execute(statement).fetchall()
+    db.session.commit()
+  except Exception as e:
+    db.session.rollback()
+    report.errors.extend((line, 'batch rolled back: {}'.format(str(e).splitlines()[0])) for line, values in pending)
+    return
+  report.inserted = sum(1 for row in written if row.inserted)
+  report.updated = len(written) - report.inserted
+  if kind != 'shows' and not upsert:
+    existing = {values['name'] for line, values in pending} - {row.name for row in written}
+    report.errors.extend((line, 'name: {!r} already exists'.format(values['name']))
+                         for line, values in pending if values['name'] in existing)
+
+def import_rows(kind, rows, batch_size=1000, upsert=False, check_conflicts=True):
+  # validates and writes rows batch by batch, yielding a BatchReport per batch. each batch
+  # is its own transaction, a failing batch is rolled back without stopping the import.
+  # shows that overlap a booked show, or an earlier row, at the same venue or with the same
+  # artist are rejected unless check_conflicts is False
+  rows = iter(rows)
+  number = 0
+  while True:
+    batch = list(islice(rows, batch_size))
+    if not batch:
+      break
+    number += 1
+    report = BatchReport(number, batch[0][0], batch[-1][0])
+    report.rows = len(batch)
+    pending = []
+    for line, row, error in batch:
+      values = None
+      if error is None:
+        values, error = validate(kind, row)
+      if error is not None:
+        report.errors.append((line, error))
+      else:
+        pending.append((line, values))
+    write_batch(kind, pending, upsert, report, check_conflicts)
+    report.errors.sort()
+    yield report
+  if kind == 'shows':
+    # bulk inserts skip the ORM events that keep the upcoming show counters current
+    reconcile_upcoming_counts()
@@ -0,0 +1,155 @@
+import threading
+import numpy as np
+from models import db, TableVersion, matching_version_name
+from genres import GENRES
+
+#----------------------------------------------------------------------------#
+# Genre bitsets.
+#----------------------------------------------------------------------------#
+
+# the genres are the fixed choice list of the forms, one bit each, so the genres of a row
+# fit in a uint32 and the genres two rows share are the bits of an AND
+GENRE_BITS = {genre: 1 << position for position, genre in enumerate(GENRES)}
+assert len(GENRE_BITS) <= 32
+
+def genre_mask(genres):
+  mask = 0
+  for genre in genres:
+    mask |= GENRE_BITS.get(genre, 0)
+  return mask
+
+def mask_genres(mask):
+  return [genre for genre in GENRES if mask & GENRE_BITS[genre]]
+
+#----------------------------------------------------------------------------#
+# Candidate matrix.
+#----------------------------------------------------------------------------#
+
+# a shared genre is worth one point, the same city and state two, and each past show the
+# two played together one, up to MAX_SHARED_SHOWS
+GENRE_WEIGHT = 1.0
+LOCATION_WEIGHT = 2.0
+HISTORY_WEIGHT = 1.0
+MAX_SHARED_SHOWS = 3
+
+class CandidateMatrix(object):
+  # the rows of one table that are seeking a match, as parallel NumPy arrays sorted by id:
+  # genre bitsets, location codes (an index into the (city, state) pairs seen) and ids.
+  # rank scores all of them against one venue or artist with a handful of vector
+  # operations, no per-row Python.
+  #
+  # the arrays are rebuilt when the table's matching version moves (see MATCHING_COLUMNS
+  # in models.py), which one primary key lookup per request finds out; bookings leave it
+  # alone. each worker process holds its own copy, the first build runs in the request
+  # and later ones in the background while the stale copy answers.
+
+  def __init__(self, model, seeking):
+    self.model = model
+    self.seeking = seeking
+    self._lock = threading.Lock()
+    self._build_lock = threading.Lock()
+    self._version = None
+    self._ids = np.zeros(0, dtype=np.int64)
+    self._genres = np.zeros(0, dtype=np.uint32)
+    self._locations = np.zeros(0, dtype=np.int32)
+    self._location_codes = {}
+
+  def current_version(self):
+    name = matching_version_name(self.model.__tablename__)
+    version = db.session.query(TableVersion.version).filter(TableVersion.name == name).scalar()
+    return version or 0
+
+  def build(self, version):
+    with self._build_lock:
+      rows = db.session.query(self.model.id, self.model.genres, self.model.city, self.model.state) \
+        .filter(self.seeking.is_(True)).order_by(self.model.id).all()
+      location_codes = {}
+      ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+      genres = np.fromiter((genre_mask(row.genres) for row in rows), dtype=np.uint32, count=len(rows))
+      locations = np.fromiter(
+        (location_codes.setdefault(location_key(row.city, row.state), len(location_codes)) for row in rows),
+        dtype=np.int32, count=len(rows))
+      with self._lock:
+        self._ids, self._genres, self._locations = ids, genres, locations
+        self._location_codes = location_codes
+        self._version = version
+
+  def ensure_fresh(self, app):
+    version = self.current_version()
+    if self._version is None:
+      with self._build_lock:
+        built = self._version is not None
+      if not built:
+        self.build(version)
+    elif version != self._version and not self._build_lock.locked():
+      def rebuild():
+        with app.app_context():
+          self.build(version)
+      threading.Thread(target=rebuild, daemon=True).start()
+
+  def rank(self, genres, city, state, shared_shows, limit=10):
+    # the limit best candidates for a row with these genres and location, shared_shows
+    # maps candidate ids to the past shows played together. returns (id, score, shared
+    # genre mask, same location, shared shows) tuples, best first, ties by id
+    with self._lock:
+      ids, candidate_genres, locations = self._ids, self._genres, self._locations
+      location = self._location_codes.get(location_key(city, state), -1)
+    shared = np.bitwise_and(candidate_genres, np.uint32(genre_mask(genres)))
+    same_location = locations == location
+    history = np.zeros(len(ids), dtype=np.int64)
+    if shared_shows and len(ids):
+      played = np.fromiter(shared_shows.keys(), dtype=np.int64, count=len(shared_shows))
+      counts = np.fromiter(shared_shows.values(), dtype=np.int64, count=len(shared_shows))
+      positions = np.minimum(np.searchsorted(ids, played), len(ids) - 1)
+      known = ids[positions] == played
+      history[positions[known]] = counts[known]
+    scores = (GENRE_WEIGHT * np.bitwise_count(shared)
+              + LOCATION_WEIGHT * same_location
+              + HISTORY_WEIGHT * np.minimum(history, MAX_SHARED_SHOWS))
+    # ids are sorted, so taking positions in order breaks score ties by id
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > limit:
+      # everything above the limit-th best score, then the lowest positions of those tied
+      # at it. argpartition alone would pick among the tied ones arbitrarily
+      candidate_scores = scores[candidates]
+      cutoff = -np.partition(-candidate_scores, limit - 1)[limit - 1]
+      above = candidates[candidate_scores > cutoff]
+      tied = candidates[candidate_scores == cutoff][:limit - len(above)]
+      candidates = np.concatenate([above, tied])
+    candidates = np.sort(candidates)
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return [(int(ids[i]), float(scores[i]), int(shared[i]), bool(same_location[i]), int(history[i]))
+            for i in candidates]
+
+def location_key(city, state):
+  return city.strip().lower(), state
+
+#----------------------------------------------------------------------------#
+# Suggestions.
+#----------------------------------------------------------------------------#
+
+def suggestions(matrix, target, shared_shows, limit=10):
+  # template data for the best matches of target (a Venue or Artist) in matrix, the names
+  # and images of the few that are shown come from one query
+  ranked = matrix.rank(target.genres, target.city, target.state, shared_shows, limit)
+  model = matrix.model
+  details = {row.id: row for row in db.session.query(model.id, model.name, model.image_link, model.city, model.state)
+             .filter(model.id.in_([id for id, score, shared, same_location, shows in ranked]))}
+  results = []
+  for id, score, shared, same_location, shows in ranked:
+    row = details.get(id)
+    if row is None:
+      # deleted since the matrix was built
+      continue
+    results.append({
+      'id': id,
+      'name': row.name,
+      'image_link': row.image_link,
+      'city': row.city,
+      'state': row.state,
+      'score': score,
+      'shared_genres': mask_genres(shared),
+      'same_location': same_location,
+      'shared_shows': shows,
+    })
+  return results
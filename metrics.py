@@ -0,0 +1,77 @@
+import os
+import time
+from flask import g, request, Response, template_rendered, before_render_template
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+# with several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+# the workers start. each process then writes its values to files there and /metrics adds
+# them up, whichever worker answers it. without it every process only reports its own
+
+REQUEST_LATENCY = Histogram(
+  'spotlight_request_duration_seconds', 'Time spent handling a request.', ['method', 'endpoint'],
+  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS = Counter('spotlight_requests_total', 'Requests handled.', ['method', 'endpoint', 'status'])
+IN_PROGRESS = Gauge('spotlight_requests_in_progress', 'Requests being handled.', multiprocess_mode='livesum')
+TEMPLATE_RENDER = Histogram(
+  'spotlight_template_render_seconds', 'Time spent rendering a template.', ['template'],
+  buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+def endpoint_label():
+  # the endpoint rather than the path, so /venues/1 and /venues/2 share a series
+  return request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+def start_request():
+  # the start of the request in the current request context, for finish_request
+  IN_PROGRESS.inc()
+  return time.perf_counter()
+
+def finish_request(started, status):
+  endpoint = endpoint_label()
+  REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - started)
+  REQUESTS.labels(request.method, endpoint, str(status)).inc()
+  IN_PROGRESS.dec()
+
+def init_metrics(app):
+  # the async pages of asgi.py skip these hooks and call start_request and finish_request
+  # themselves
+  @app.before_request
+  def start_timer():
+    g.request_started = start_request()
+
+  @app.after_request
+  def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+  @app.teardown_request
+  def record_request(exc):
+    # teardown also runs for requests that raised, which are counted as 500s
+    started = g.pop('request_started', None)
+    if started is None:
+      return
+    finish_request(started, g.pop('response_status', 500))
+
+  def start_render(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+  def record_render(sender, template, context, **extra):
+    TEMPLATE_RENDER.labels(template.name).observe(time.perf_counter() - g.render_started.pop())
+
+  before_render_template.connect(start_render, app, weak=False)
+  template_rendered.connect(record_render, app, weak=False)
+
+  @app.route('/metrics')
+  def metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+      registry = CollectorRegistry()
+      multiprocess.MultiProcessCollector(registry)
+    else:
+      registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,36 @@
+"""shows surrogate key and indexes
+
+Revision ID: 2f6d9c0e8a15
+Revises: 9e4b27a1c6d3
+Create Date: 2026-10-18 19:42:05.226914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6d9c0e8a15'
+down_revision = '9e4b27a1c6d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('Shows_pkey', 'Shows', type_='primary')
+    op.execute('ALTER TABLE "Shows" ADD COLUMN id SERIAL')
+    op.create_primary_key('Shows_pkey', 'Shows', ['id'])
+    op.create_index('ix_Shows_venue_id_start_time', 'Shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Shows_artist_id_start_time', 'Shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Shows_start_time_id', 'Shows', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    # fails if a venue and artist have more than one show together, which the old
+    # primary key did not allow
+    op.drop_index('ix_Shows_start_time_id', table_name='Shows')
+    op.drop_index('ix_Shows_artist_id_start_time', table_name='Shows')
+    op.drop_index('ix_Shows_venue_id_start_time', table_name='Shows')
+    op.drop_constraint('Shows_pkey', 'Shows', type_='primary')
+    op.drop_column('Shows', 'id')
+    op.create_primary_key('Shows_pkey', 'Shows', ['venue_id', 'artist_id'])
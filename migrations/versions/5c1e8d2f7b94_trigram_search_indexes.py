@@ -0,0 +1,36 @@
+"""trigram search indexes
+
+Revision ID: 5c1e8d2f7b94
+Revises: a3409169e3e6
+Create Date: 2026-10-18 18:02:11.734102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8d2f7b94'
+down_revision = 'a3409169e3e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Venue_location_trgm', 'Venue', [sa.text("(city || ', ' || state) gin_trgm_ops")],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_location_trgm', 'Artist', [sa.text("(city || ', ' || state) gin_trgm_ops")],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_location_trgm', table_name='Artist')
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_location_trgm', table_name='Venue')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
+    # pg_trgm is left installed, other database objects may depend on it
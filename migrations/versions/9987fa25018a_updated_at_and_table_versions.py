@@ -0,0 +1,64 @@
+"""updated_at and table versions
+
+Revision ID: 9987fa25018a
+Revises: 2f6d9c0e8a15
+Create Date: 2026-10-18 20:31:17.640152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9987fa25018a'
+down_revision = '2f6d9c0e8a15'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist', 'Shows']
+UTC_NOW = sa.text("(now() at time zone 'utc')")
+OPERATIONS = [('insert', 'REFERENCING NEW TABLE AS changed'), ('update', 'REFERENCING NEW TABLE AS changed'),
+              ('delete', 'REFERENCING OLD TABLE AS changed'), ('truncate', '')]
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=UTC_NOW, nullable=False))
+    op.create_table('TableVersion',
+        sa.Column('name', sa.String(length=63), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=UTC_NOW, nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(sa.table('TableVersion', sa.column('name'), sa.column('version')),
+                   [{'name': table, 'version': 0} for table in TABLES])
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP <> 'TRUNCATE' THEN
+            IF NOT EXISTS (SELECT 1 FROM changed) THEN
+              RETURN NULL;
+            END IF;
+          END IF;
+          INSERT INTO "TableVersion" (name, version, updated_at) VALUES (TG_TABLE_NAME, 1, now() at time zone 'utc')
+          ON CONFLICT (name) DO UPDATE SET version = "TableVersion".version + 1, updated_at = excluded.updated_at;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in TABLES:
+        for operation, referencing in OPERATIONS:
+            op.execute('''
+                CREATE TRIGGER "{table}_version_{operation}" AFTER {operation} ON "{table}" {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+            '''.format(table=table, operation=operation, referencing=referencing))
+
+
+def downgrade():
+    for table in TABLES:
+        for operation, referencing in OPERATIONS:
+            op.execute('DROP TRIGGER "{table}_version_{operation}" ON "{table}"'.format(table=table, operation=operation))
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('TableVersion')
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
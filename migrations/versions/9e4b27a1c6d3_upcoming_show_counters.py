@@ -0,0 +1,34 @@
+"""upcoming show counters
+
+Revision ID: 9e4b27a1c6d3
+Revises: 5c1e8d2f7b94
+Create Date: 2026-10-18 19:10:42.518337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b27a1c6d3'
+down_revision = '5c1e8d2f7b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    # backfill, afterwards `flask spotlight reconcile-counts` keeps them current
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute('''
+            UPDATE "{table}" SET upcoming_shows_count = upcoming.n
+            FROM (SELECT {key} AS id, count(*) AS n FROM "Shows"
+                  WHERE start_time > now() GROUP BY {key}) AS upcoming
+            WHERE "{table}".id = upcoming.id
+        '''.format(table=table, key=key))
+
+
+def downgrade():
+    op.drop_column('Artist', 'upcoming_shows_count')
+    op.drop_column('Venue', 'upcoming_shows_count')
@@ -0,0 +1,53 @@
+"""matching versions
+
+Revision ID: b8d2f6a41c73
+Revises: e7c3a5f19b42
+Create Date: 2026-10-19 10:12:44.318206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2f6a41c73'
+down_revision = 'e7c3a5f19b42'
+branch_labels = None
+depends_on = None
+
+SEEKING = {'Venue': 'seeking_talent', 'Artist': 'seeking_venue'}
+CHANGED = ' OR '.join('OLD.{0} IS DISTINCT FROM NEW.{0}'.format(column) for column in ('genres', 'city', 'state'))
+
+
+def upgrade():
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_matching_version() RETURNS trigger AS $$
+        BEGIN
+          INSERT INTO "TableVersion" (name, version, updated_at) VALUES (TG_TABLE_NAME || '.matching', 1, now() at time zone 'utc')
+          ON CONFLICT (name) DO UPDATE SET version = "TableVersion".version + 1, updated_at = excluded.updated_at;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table, seeking in SEEKING.items():
+        for operation, when in (
+            ('insert', 'NEW.{}'.format(seeking)),
+            ('update', 'OLD.{0} IS DISTINCT FROM NEW.{0} OR ((OLD.{0} OR NEW.{0}) AND ({1}))'.format(seeking, CHANGED)),
+            ('delete', 'OLD.{}'.format(seeking)),
+        ):
+            op.execute('''
+                CREATE TRIGGER "{table}_matching_{operation}" AFTER {operation} ON "{table}" FOR EACH ROW
+                WHEN ({when}) EXECUTE FUNCTION bump_matching_version()
+            '''.format(table=table, operation=operation, when=when))
+        op.execute('''
+            CREATE TRIGGER "{table}_matching_truncate" AFTER TRUNCATE ON "{table}"
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_matching_version()
+        '''.format(table=table))
+
+
+def downgrade():
+    for table in SEEKING:
+        for operation in ('insert', 'update', 'delete', 'truncate'):
+            op.execute('DROP TRIGGER "{table}_matching_{operation}" ON "{table}"'.format(table=table, operation=operation))
+    op.execute('DROP FUNCTION bump_matching_version()')
+    op.execute('''DELETE FROM "TableVersion" WHERE name LIKE '%.matching' ''')
@@ -0,0 +1,36 @@
+"""show durations and period indexes
+
+Revision ID: d4e8b1c7a2f6
+Revises: 6b1f3a9d2e07
+Create Date: 2026-10-18 22:05:53.201947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8b1c7a2f6'
+down_revision = '6b1f3a9d2e07'
+branch_labels = None
+depends_on = None
+
+SHOW_PERIOD = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+
+def upgrade():
+    op.add_column('Shows', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    op.create_check_constraint('ck_Shows_duration_minutes', 'Shows', 'duration_minutes > 0')
+    op.create_index('ix_Shows_venue_period', 'Shows',
+                    [sa.text("int4range(venue_id, venue_id, '[]')"), sa.text(SHOW_PERIOD)],
+                    unique=False, postgresql_using='gist')
+    op.create_index('ix_Shows_artist_period', 'Shows',
+                    [sa.text("int4range(artist_id, artist_id, '[]')"), sa.text(SHOW_PERIOD)],
+                    unique=False, postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('ix_Shows_artist_period', table_name='Shows')
+    op.drop_index('ix_Shows_venue_period', table_name='Shows')
+    op.drop_constraint('ck_Shows_duration_minutes', 'Shows', type_='check')
+    op.drop_column('Shows', 'duration_minutes')
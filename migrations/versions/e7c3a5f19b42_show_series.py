@@ -0,0 +1,42 @@
+"""show series
+
+Revision ID: e7c3a5f19b42
+Revises: d4e8b1c7a2f6
+Create Date: 2026-10-18 23:41:08.514362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3a5f19b42'
+down_revision = 'd4e8b1c7a2f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowSeries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('frequency', sa.String(length=16), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('first_start_time', sa.DateTime(), nullable=False),
+    sa.Column('last_start_time', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('Shows', sa.Column('series_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('Shows_series_id_fkey', 'Shows', 'ShowSeries', ['series_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_Shows_series_id', 'Shows', ['series_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Shows_series_id', table_name='Shows')
+    op.drop_constraint('Shows_series_id_fkey', 'Shows', type_='foreignkey')
+    op.drop_column('Shows', 'series_id')
+    op.drop_table('ShowSeries')
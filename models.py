@@ -1,22 +1,145 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+import random
+import time
+from datetime import datetime
+from flask import Flask, g, request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, DDL, func, orm
 
-db = SQLAlchemy()
-def setup_db(app, config_filename):
-    app.config.from_object(config_filename)
+#----------------------------------------------------------------------------#
+# Replica routing.
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+  # sends the statements of read-only requests to the replica bind picked for the request
+  # (g.db_replica, see setup_replica_routing). flushes, and everything after the request
+  # wrote, go to the primary
+  def get_bind(self, mapper=None, clause=None, **kw):
+    if has_request_context() and g.get('db_replica') and not g.get('db_wrote') and not self._flushing:
+      return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=g.db_replica)
+    return SignallingSession.get_bind(self, mapper, clause)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def mark_write(session, flush_context):
+  if has_request_context():
+    g.db_wrote = True
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+def replica_for_request(app):
+  # the replica bind the current request may read from, None for the primary
+  replicas = app.config.get('DB_REPLICA_BINDS') or []
+  if not replicas or request.method not in ('GET', 'HEAD') or request.endpoint in app.config['DB_PRIMARY_ENDPOINTS']:
+    return None
+  written_at = session.get('db_written_at')
+  if written_at and time.time() - written_at < app.config['DB_READ_YOUR_WRITES_SECONDS']:
+    return None
+  return random.choice(replicas)
+
+def setup_replica_routing(app):
+  # GET and HEAD requests read from one of DB_REPLICA_BINDS, except DB_PRIMARY_ENDPOINTS
+  # (GET handlers that write) and the requests of a user who wrote in the last
+  # DB_READ_YOUR_WRITES_SECONDS, which is remembered in their session cookie. the hooks
+  # check DB_REPLICA_BINDS per request, so the routing can be switched on after startup
+  @app.before_request
+  def route_reads():
+    g.db_replica = replica_for_request(app)
+    g.db_wrote = False
+
+  @app.after_request
+  def remember_write(response):
+    if g.get('db_wrote') and app.config.get('DB_REPLICA_BINDS'):
+      session['db_written_at'] = time.time()
+    return response
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+db = RoutingSQLAlchemy()
+# the trigram indexes on Venue and Artist need pg_trgm
+event.listen(db.metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+# updated_at columns hold UTC, rows written outside the ORM get the server's clock
+UTC_NOW = db.text("(now() at time zone 'utc')")
+def setup_db(app, config_object):
+    app.config.from_object(config_object)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
     # The init_app method is used to support the factory pattern for creating apps
     db.init_app(app)
+    setup_replica_routing(app)
+
+def engine_options(config):
+    # pool settings from the DB_* config values, see config.Config
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT_MS']}
+    return options
+
+# a show occupies its venue and artist for [start_time, start_time + duration_minutes)
+DEFAULT_SHOW_MINUTES = 120
+SHOW_PERIOD = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+def show_period(shows):
+  # SHOW_PERIOD over the columns of shows (Shows or an alias of it), spelled the way the
+  # indexes are so the planner can use them
+  return db.func.tsrange(shows.start_time, shows.start_time + shows.duration_minutes * db.text("interval '1 minute'"))
 
 class Shows(db.Model):
   __tablename__ = 'Shows'
-  venue_id = db.Column(db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
-  artist_id = db.Column(db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+  # every show query filters one venue or one artist by start_time, or walks all shows in
+  # (start_time, id) order for the /shows pages
+  __table_args__ = (
+    db.Index('ix_Shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Shows_start_time_id', 'start_time', 'id'),
+    # booking conflicts, the id ranges stand in for the ids since GiST has no integer
+    # equality without btree_gist
+    db.Index('ix_Shows_venue_period', db.text("int4range(venue_id, venue_id, '[]')"), db.text(SHOW_PERIOD), postgresql_using='gist'),
+    db.Index('ix_Shows_artist_period', db.text("int4range(artist_id, artist_id, '[]')"), db.text(SHOW_PERIOD), postgresql_using='gist'),
+    db.CheckConstraint('duration_minutes > 0', name='ck_Shows_duration_minutes'),
+    db.Index('ix_Shows_series_id', 'series_id'),
+  )
+  id = db.Column(db.Integer, primary_key=True)
+  venue_id = db.Column(db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+  artist_id = db.Column(db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
   start_time = db.Column(db.DateTime, nullable=False)
+  duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES, server_default=str(DEFAULT_SHOW_MINUTES))
+  # set on the shows of a recurring series, which the pages show as one tile
+  series_id = db.Column(db.ForeignKey('ShowSeries.id', ondelete='CASCADE'))
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=UTC_NOW)
   venue = db.relationship('Venue', back_populates='shows')
   artist = db.relationship('Artist', back_populates='shows')
 
+class ShowSeries(db.Model):
+  # a weekly or monthly residency, expanded into its Shows rows when it is created. the
+  # rule is kept to describe the series, count is the number of shows it was created with
+  __tablename__ = 'ShowSeries'
+  id = db.Column(db.Integer, primary_key=True)
+  venue_id = db.Column(db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+  artist_id = db.Column(db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+  frequency = db.Column(db.String(16), nullable=False)
+  interval = db.Column(db.Integer, nullable=False, default=1)
+  first_start_time = db.Column(db.DateTime, nullable=False)
+  last_start_time = db.Column(db.DateTime, nullable=False)
+  count = db.Column(db.Integer, nullable=False)
+
 class Venue(db.Model):
   __tablename__ = 'Venue'
+  # trigram indexes serve the case-insensitive partial and fuzzy matching in search_venues
+  __table_args__ = (
+    db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_Venue_location_trgm', db.text("(city || ', ' || state) gin_trgm_ops"), postgresql_using='gin'),
+    # serves the && and @> genre filters of the listing
+    db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, unique=True, nullable=False)
@@ -30,10 +153,21 @@ class Venue(db.Model):
   website = db.Column(db.String(120))
   seeking_talent = db.Column(db.Boolean, default = False)
   seeking_description = db.Column(db.Text)
-  shows = db.relationship('Shows', back_populates='venue', cascade='all, delete')
+  # maintained by the Shows insert/delete events below and by reconcile_upcoming_counts
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  # bumped by every change to the row, including the counter shifts below
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=UTC_NOW)
+  shows = db.relationship('Shows', back_populates='venue', cascade='all, delete', order_by='Shows.start_time')
 
 class Artist(db.Model):
   __tablename__ = 'Artist'
+  # trigram indexes serve the case-insensitive partial and fuzzy matching in search_artists
+  __table_args__ = (
+    db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_Artist_location_trgm', db.text("(city || ', ' || state) gin_trgm_ops"), postgresql_using='gin'),
+    # serves the && and @> genre filters of the listing
+    db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, unique=True, nullable=False)
@@ -46,4 +180,146 @@ class Artist(db.Model):
   website = db.Column(db.String(120))
   seeking_venue = db.Column(db.Boolean, default = False)
   seeking_description = db.Column(db.Text)
-  shows = db.relationship('Shows', back_populates='artist', cascade='all, delete')
\ No newline at end of file
+  # maintained by the Shows insert/delete events below and by reconcile_upcoming_counts
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  # bumped by every change to the row, including the counter shifts below
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=UTC_NOW)
+  shows = db.relationship('Shows', back_populates='artist', cascade='all, delete', order_by='Shows.start_time')
+
+#----------------------------------------------------------------------------#
+# Table versions.
+#----------------------------------------------------------------------------#
+
+class TableVersion(db.Model):
+  # one row per table, bumped by statement triggers on every write that changed rows of
+  # it, including COPY, Core statements and cascades. the listings build their ETags from
+  # these instead of scanning the tables
+  __tablename__ = 'TableVersion'
+  name = db.Column(db.String(63), primary_key=True)
+  version = db.Column(db.BigInteger, nullable=False, default=0)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=UTC_NOW)
+
+BUMP_TABLE_VERSION = '''
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+  -- statements that matched no rows, like most reconcile-counts runs, change nothing
+  IF TG_OP <> 'TRUNCATE' THEN
+    IF NOT EXISTS (SELECT 1 FROM changed) THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+  INSERT INTO "TableVersion" (name, version, updated_at) VALUES (TG_TABLE_NAME, 1, now() at time zone 'utc')
+  ON CONFLICT (name) DO UPDATE SET version = "TableVersion".version + 1, updated_at = excluded.updated_at;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+'''
+
+def version_triggers(table):
+  # a trigger with transition tables can only handle one kind of statement
+  return ['''
+CREATE TRIGGER "{table}_version_{op}" AFTER {op} ON "{table}" {referencing}
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+'''.format(table=table, op=op, referencing=referencing) for op, referencing in (
+    ('insert', 'REFERENCING NEW TABLE AS changed'),
+    ('update', 'REFERENCING NEW TABLE AS changed'),
+    ('delete', 'REFERENCING OLD TABLE AS changed'),
+    ('truncate', ''),
+  )]
+
+# the candidate matrices of matchmaking.py only hold the genres, location and seeking
+# flag of the rows that are seeking a match. their own version rows ('Venue.matching',
+# 'Artist.matching') only move when one of those changes, not with the counter shifts
+# and updated_at bumps every booking writes
+MATCHING_COLUMNS = {'Venue': 'seeking_talent', 'Artist': 'seeking_venue'}
+
+def matching_version_name(table):
+  return table + '.matching'
+
+BUMP_MATCHING_VERSION = '''
+CREATE OR REPLACE FUNCTION bump_matching_version() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO "TableVersion" (name, version, updated_at) VALUES (TG_TABLE_NAME || '.matching', 1, now() at time zone 'utc')
+  ON CONFLICT (name) DO UPDATE SET version = "TableVersion".version + 1, updated_at = excluded.updated_at;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+'''
+
+def matching_triggers(table, seeking):
+  # row triggers, the WHEN conditions skip the rows outside the matrix and the updates
+  # that leave its columns alone without calling the function
+  changed = ' OR '.join('OLD.{0} IS DISTINCT FROM NEW.{0}'.format(column) for column in ('genres', 'city', 'state'))
+  return ['''
+CREATE TRIGGER "{table}_matching_{op}" AFTER {op} ON "{table}" FOR EACH ROW
+WHEN ({when}) EXECUTE FUNCTION bump_matching_version()
+'''.format(table=table, op=op, when=when) for op, when in (
+    ('insert', 'NEW.{}'.format(seeking)),
+    ('update', 'OLD.{0} IS DISTINCT FROM NEW.{0} OR ((OLD.{0} OR NEW.{0}) AND ({1}))'.format(seeking, changed)),
+    ('delete', 'OLD.{}'.format(seeking)),
+  )] + ['''
+CREATE TRIGGER "{table}_matching_truncate" AFTER TRUNCATE ON "{table}"
+FOR EACH STATEMENT EXECUTE FUNCTION bump_matching_version()
+'''.format(table=table)]
+
+event.listen(db.metadata, 'before_create', DDL(BUMP_TABLE_VERSION))
+event.listen(db.metadata, 'before_create', DDL(BUMP_MATCHING_VERSION))
+for model in (Venue, Artist, Shows):
+  for trigger in version_triggers(model.__tablename__):
+    event.listen(model.__table__, 'after_create', DDL(trigger))
+for model in (Venue, Artist):
+  for trigger in matching_triggers(model.__tablename__, MATCHING_COLUMNS[model.__tablename__]):
+    event.listen(model.__table__, 'after_create', DDL(trigger))
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+def shift_upcoming_counts(connection, venue_id, artist_id, delta):
+  # also used by writes that insert shows without the ORM, like create_series
+  for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+    table = model.__table__
+    connection.execute(
+      table.update().where(table.c.id == entity_id)
+        .values(upcoming_shows_count=table.c.upcoming_shows_count + delta)
+    )
+
+def _shift_upcoming_counts(connection, show, delta):
+  if show.start_time <= datetime.now():
+    return
+  shift_upcoming_counts(connection, show.venue_id, show.artist_id, delta)
+
+@event.listens_for(Shows, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+  _shift_upcoming_counts(connection, show, 1)
+
+@event.listens_for(Shows, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+  # also fires for the shows removed by the venue and artist delete cascades
+  _shift_upcoming_counts(connection, show, -1)
+  if show.start_time <= datetime.now():
+    # the counters stay, but the venue and artist pages listed the past show
+    for model, entity_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+      table = model.__table__
+      connection.execute(table.update().where(table.c.id == entity_id).values(updated_at=datetime.utcnow()))
+
+def reconcile_upcoming_counts(now=None):
+  # recomputes the counters from Shows, which also catches shows that have started since
+  # they were counted and rows written without the ORM. only rows whose count changed
+  # are written. returns the number of venues and artists updated
+  now = now or datetime.now()
+  updated = []
+  for model, key in ((Venue, Shows.venue_id), (Artist, Shows.artist_id)):
+    upcoming = db.session.query(key.label('id'), func.count().label('n')) \
+      .filter(Shows.start_time > now).group_by(key).subquery()
+    actual = db.session.query(model.id, func.coalesce(upcoming.c.n, 0).label('n')) \
+      .outerjoin(upcoming, upcoming.c.id == model.id).subquery()
+    result = db.session.execute(
+      model.__table__.update()
+        .where(model.__table__.c.id == actual.c.id)
+        .where(model.__table__.c.upcoming_shows_count != actual.c.n)
+        .values(upcoming_shows_count=actual.c.n)
+    )
+    updated.append(result.rowcount)
+  db.session.commit()
+  return tuple(updated)
\ No newline at end of file
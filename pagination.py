@@ -0,0 +1,121 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import request, abort, url_for
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+#----------------------------------------------------------------------------#
+# Cursors.
+#----------------------------------------------------------------------------#
+
+# a cursor is the sort key of the row a page starts after (or ends before),
+# serialized as url-safe base64 json so it can travel in a query string
+
+def encode_cursor(values):
+  raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+  # raises ValueError for anything that was not produced by encode_cursor for these columns
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+  except (TypeError, UnicodeDecodeError, binascii.Error, json.JSONDecodeError) as e:
+    raise ValueError('malformed cursor') from e
+  if not isinstance(values, list) or len(values) != len(columns):
+    raise ValueError('malformed cursor')
+  decoded = []
+  for column, value in zip(columns, values):
+    if column.type.python_type is datetime and isinstance(value, str):
+      value = datetime.fromisoformat(value)
+    elif not isinstance(value, column.type.python_type):
+      raise ValueError('malformed cursor')
+    decoded.append(value)
+  return decoded
+
+#----------------------------------------------------------------------------#
+# Pages.
+#----------------------------------------------------------------------------#
+
+class Page(object):
+  def __init__(self, items, limit, next_cursor=None, prev_cursor=None):
+    self.items = items
+    self.limit = limit
+    self.next_cursor = next_cursor
+    self.prev_cursor = prev_cursor
+    self.next_url = None
+    self.prev_url = None
+
+  def __iter__(self):
+    return iter(self.items)
+
+  def __len__(self):
+    return len(self.items)
+
+def page_query(query, columns, limit=DEFAULT_PAGE_SIZE, after=None, before=None):
+  # keyset pagination: the page is found by comparing the sort key against the cursor,
+  # so fetching page N costs the same as fetching page 1. columns must be unique
+  # together and every row must expose them as attributes of the same name.
+  key = tuple_(*columns)
+  if before is not None:
+    query = query.filter(key < tuple_(*before)).order_by(*[column.desc() for column in columns])
+  else:
+    if after is not None:
+      query = query.filter(key > tuple_(*after))
+    query = query.order_by(*columns)
+  # one extra row tells us whether there is another page in the direction of travel
+  return query.limit(limit + 1)
+
+def build_page(rows, columns, limit=DEFAULT_PAGE_SIZE, after=None, before=None):
+  # the Page for the rows page_query fetched
+  more = len(rows) > limit
+  rows = rows[:limit]
+  if before is not None:
+    rows.reverse()
+
+  def cursor(row):
+    return encode_cursor([getattr(row, column.key) for column in columns])
+
+  # paging backwards with ?before= means the page we came from still follows this one,
+  # and paging forwards with ?after= means the page we came from still precedes it
+  has_next = more if before is None else True
+  has_prev = more if before is not None else after is not None
+  next_cursor = cursor(rows[-1]) if rows and has_next else None
+  prev_cursor = cursor(rows[0]) if rows and has_prev else None
+  return Page(rows, limit, next_cursor, prev_cursor)
+
+def paginate(query, columns, limit=DEFAULT_PAGE_SIZE, after=None, before=None):
+  rows = page_query(query, columns, limit, after, before).all()
+  return build_page(rows, columns, limit, after, before)
+
+def request_page_args(columns):
+  # (limit, after, before) from ?limit=, ?after= and ?before= of the current request,
+  # aborting with 400 on bad input
+  limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+  if limit < 1:
+    abort(400)
+  try:
+    after = request.args.get('after')
+    after = decode_cursor(after, columns) if after else None
+    before = request.args.get('before')
+    before = decode_cursor(before, columns) if before else None
+  except ValueError:
+    abort(400)
+  return limit, after, before
+
+def link_page(page, **link_args):
+  # next/prev links back to the current endpoint
+  link_args.update(request.view_args or {})
+  if page.next_cursor:
+    page.next_url = url_for(request.endpoint, after=page.next_cursor, limit=page.limit, **link_args)
+  if page.prev_cursor:
+    page.prev_url = url_for(request.endpoint, before=page.prev_cursor, limit=page.limit, **link_args)
+  return page
+
+def paginate_request(query, columns, **link_args):
+  # paginates query by the current request's arguments and links the neighbouring pages
+  limit, after, before = request_page_args(columns)
+  return link_page(paginate(query, columns, limit, after, before), **link_args)
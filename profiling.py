@@ -0,0 +1,138 @@
+import cProfile
+import hmac
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from flask import g, request, abort, jsonify, send_from_directory, url_for
+
+#----------------------------------------------------------------------------#
+# Profilers.
+#----------------------------------------------------------------------------#
+
+class SamplingProfiler(object):
+  # samples the stack of one thread every interval seconds from a background thread.
+  # cheaper than cProfile on deep call trees, and the result is collapsed stacks
+  # ("frame;frame;frame count" lines) that flamegraph.pl and speedscope read directly
+
+  extension = 'collapsed'
+
+  def __init__(self, interval=0.005):
+    self.interval = interval
+    self.stacks = Counter()
+    self._thread_id = None
+    self._stop = threading.Event()
+    self._sampler = None
+
+  def enable(self):
+    self._thread_id = threading.get_ident()
+    self._sampler = threading.Thread(target=self._run, daemon=True)
+    self._sampler.start()
+
+  def disable(self):
+    self._stop.set()
+    self._sampler.join()
+
+  def _run(self):
+    while not self._stop.wait(self.interval):
+      frame = sys._current_frames().get(self._thread_id)
+      stack = []
+      while frame is not None:
+        code = frame.f_code
+        stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+      if stack:
+        self.stacks[';'.join(reversed(stack))] += 1
+
+  def dump_stats(self, path):
+    with open(path, 'w') as f:
+      for stack, count in self.stacks.most_common():
+        f.write('{} {}\n'.format(stack, count))
+
+class CallProfiler(cProfile.Profile):
+  # deterministic cProfile, saved as pstats for `python -m pstats` or snakeviz
+  extension = 'pstats'
+
+PROFILERS = {'cprofile': CallProfiler, 'sampling': SamplingProfiler}
+
+#----------------------------------------------------------------------------#
+# Request hooks.
+#----------------------------------------------------------------------------#
+
+def authorized(app):
+  # PROFILE_TOKEN unset turns on-demand profiling and the download routes off
+  token = app.config.get('PROFILE_TOKEN')
+  given = request.headers.get('X-Profile') or request.args.get('profile')
+  return bool(token and given and hmac.compare_digest(token, given))
+
+def make_profiler(app, kind):
+  if kind == 'sampling':
+    return SamplingProfiler(app.config.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+  return CallProfiler()
+
+def prune(directory, keep):
+  # keeps the newest profiles only, so background sampling cannot fill the disk
+  names = sorted(os.listdir(directory), key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+  for name in names[:max(0, len(names) - keep)]:
+    os.remove(os.path.join(directory, name))
+
+def init_profiling(app):
+  # a request runs under a profiler when it carries PROFILE_TOKEN in an X-Profile header
+  # or a profile= query argument (profiler=sampling picks the sampling profiler), or at
+  # random for PROFILE_SAMPLE_RATE of the requests to PROFILE_ENDPOINTS. profiles are
+  # written to PROFILE_DIR and listed and downloaded at /profiles with the same token
+  directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+  @app.before_request
+  def start_profiler():
+    if request.endpoint in ('list_profiles', 'download_profile'):
+      return
+    if authorized(app):
+      kind = request.headers.get('X-Profiler') or request.args.get('profiler', 'cprofile')
+    elif (request.endpoint in app.config.get('PROFILE_ENDPOINTS', ())
+          and random.random() < app.config.get('PROFILE_SAMPLE_RATE', 0)):
+      kind = app.config.get('PROFILE_SAMPLER', 'sampling')
+    else:
+      return
+    if kind not in PROFILERS:
+      abort(400)
+    profiler = make_profiler(app, kind)
+    try:
+      profiler.enable()
+    except ValueError:
+      # another request in this process is already under cProfile
+      return
+    g.profiler = profiler
+    g.profile_name = '{}-{}-{}.{}'.format(datetime.now().strftime('%Y%m%dT%H%M%S%f'), request.endpoint,
+                                          os.getpid(), profiler.extension)
+
+  @app.after_request
+  def profile_header(response):
+    if 'profiler' in g:
+      response.headers['X-Profile-Id'] = g.profile_name
+    return response
+
+  @app.teardown_request
+  def save_profile(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+      return
+    profiler.disable()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, g.profile_name))
+    prune(directory, app.config.get('PROFILE_KEEP', 200))
+
+  @app.route('/profiles')
+  def list_profiles():
+    if not authorized(app):
+      abort(404)
+    names = sorted(os.listdir(directory), reverse=True) if os.path.isdir(directory) else []
+    return jsonify(profiles=[{'name': name, 'url': url_for('download_profile', name=name)} for name in names])
+
+  @app.route('/profiles/<name>')
+  def download_profile(name):
+    if not authorized(app):
+      abort(404)
+    return send_from_directory(directory, name, as_attachment=True)
@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+  return TOKEN_PATTERN.findall(text.lower())
+
+#----------------------------------------------------------------------------#
+# Suggestion index.
+#----------------------------------------------------------------------------#
+
+class SuggestIndex(object):
+  # in-memory prefix index over venue and artist names for typeahead suggestions.
+  #
+  # every token of every name is kept in one sorted list of (token, kind, id) entries, so
+  # the entries whose token starts with a prefix are a contiguous slice found by bisection.
+  # the index is built from the database on first use (load returns (kind, id, name)
+  # tuples) and kept current by the handlers that create, edit and delete venues and
+  # artists. each worker process holds its own copy, so changes made through another
+  # worker are picked up by the periodic rebuild after max_age seconds.
+
+  def __init__(self, load, max_age=300):
+    self._load = load
+    self.max_age = max_age
+    self._lock = threading.Lock()
+    self._build_lock = threading.Lock()
+    self._entries = []
+    self._names = {}
+    self._built_at = None
+    # changes that arrive while a build is reading the database, replayed on top of it
+    self._pending = None
+
+  def build(self):
+    with self._build_lock:
+      with self._lock:
+        self._pending = []
+      entries, names = [], {}
+      for kind, id, name in self._load():
+        tokens = tokenize(name)
+        names[(kind, id)] = (name, tokens)
+        entries.extend((token, kind, id) for token in set(tokens))
+      entries.sort()
+      with self._lock:
+        self._entries, self._names = entries, names
+        for kind, id, name in self._pending:
+          self._apply(kind, id, name)
+        self._pending = None
+        self._built_at = time.monotonic()
+
+  def ensure_fresh(self, app):
+    # the first call builds the index in the request, later rebuilds run in the
+    # background while the stale index keeps answering
+    if self._built_at is None:
+      with self._build_lock:
+        built = self._built_at is not None
+      if not built:
+        self.build()
+    elif time.monotonic() - self._built_at > self.max_age and not self._build_lock.locked():
+      def rebuild():
+        with app.app_context():
+          self.build()
+      threading.Thread(target=rebuild, daemon=True).start()
+
+  def _apply(self, kind, id, name):
+    # replaces the entries of (kind, id), name None removes them. caller holds the lock
+    known = self._names.pop((kind, id), None)
+    if known is not None:
+      for token in set(known[1]):
+        position = bisect_left(self._entries, (token, kind, id))
+        if position < len(self._entries) and self._entries[position] == (token, kind, id):
+          del self._entries[position]
+    if name is not None:
+      tokens = tokenize(name)
+      self._names[(kind, id)] = (name, tokens)
+      for token in set(tokens):
+        insort(self._entries, (token, kind, id))
+
+  def _change(self, kind, id, name):
+    with self._lock:
+      if self._pending is not None:
+        self._pending.append((kind, id, name))
+      if self._built_at is not None:
+        self._apply(kind, id, name)
+
+  def add(self, kind, id, name):
+    self._change(kind, id, name)
+
+  def remove(self, kind, id):
+    self._change(kind, id, None)
+
+  def suggest(self, query, limit=10):
+    # every query token has to prefix-match some token of the name. the candidates come
+    # from the slice of the rarest query token, the others are checked per candidate
+    terms = tokenize(query)
+    if not terms:
+      return []
+    results, seen = [], set()
+    with self._lock:
+      entries = self._entries
+      slices = []
+      for term in terms:
+        start = bisect_left(entries, (term,))
+        end = bisect_left(entries, (term + '\uffff',), start)
+        slices.append((end - start, start, end, term))
+      size, start, end, rarest = min(slices)
+      others = [term for term in terms if term != rarest]
+      for position in range(start, end):
+        token, kind, id = entries[position]
+        if (kind, id) in seen:
+          continue
+        name, tokens = self._names[(kind, id)]
+        if all(any(t.startswith(term) for t in tokens) for term in others):
+          seen.add((kind, id))
+          results.append({'type': kind, 'id': id, 'name': name})
+          if len(results) == limit:
+            break
+    return results
@@ -0,0 +1,96 @@
+import calendar
+from datetime import datetime, time
+from itertools import islice
+from dateutil.rrule import rrule, WEEKLY, MONTHLY
+from sqlalchemy import insert
+from models import db, Shows, ShowSeries, shift_upcoming_counts
+
+#----------------------------------------------------------------------------#
+# Recurring shows.
+#----------------------------------------------------------------------------#
+
+# a series is an RRULE with FREQ=WEEKLY or MONTHLY, an INTERVAL and an UNTIL date or a
+# COUNT. it is expanded into its start times once, when it is created, and every start
+# time becomes an ordinary Shows row, so the booking checks, counters and pages treat
+# them like any other show
+
+FREQUENCIES = {'weekly': WEEKLY, 'monthly': MONTHLY}
+MAX_SERIES_SHOWS = 104
+
+def occurrences(first_start_time, frequency, interval=1, until=None, count=None):
+  # the start times of a series, until is the last day shows may fall on. at most one past
+  # MAX_SERIES_SHOWS are expanded, enough for the caller to tell the series is too long
+  if until is not None:
+    until = datetime.combine(until, time.max)
+  days = monthly_days(first_start_time) if frequency == 'monthly' else {}
+  rule = rrule(FREQUENCIES[frequency], dtstart=first_start_time, interval=interval, until=until, count=count, **days)
+  return list(islice(rule, MAX_SERIES_SHOWS + 1))
+
+def is_last_day(value):
+  return value.day == calendar.monthrange(value.year, value.month)[1]
+
+def monthly_days(first_start_time):
+  # the day of month rule arguments of a monthly series. rrule skips the months that lack
+  # the start day, so a series from the last day of a month stays on the last day, and
+  # one from the 29th or 30th falls on the last day of the months that are shorter
+  if is_last_day(first_start_time):
+    return {'bymonthday': -1}
+  if first_start_time.day > 28:
+    return {'bymonthday': (first_start_time.day, -1), 'bysetpos': 1}
+  return {}
+
+def ordinal(day):
+  suffix = 'th' if 10 <= day % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+  return '{}{}'.format(day, suffix)
+
+def describe_series(frequency, interval, first_start_time):
+  # "Every Friday", "Every 2 weeks on Friday", "Monthly on the 5th", "Every 3 months on the
+  # last day", "Monthly on the 30th or the last day of shorter months"
+  if frequency == 'weekly':
+    day = first_start_time.strftime('%A')
+    return 'Every {}'.format(day) if interval == 1 else 'Every {} weeks on {}'.format(interval, day)
+  if is_last_day(first_start_time):
+    day = 'last day'
+  elif first_start_time.day > 28:
+    day = '{} or the last day of shorter months'.format(ordinal(first_start_time.day))
+  else:
+    day = ordinal(first_start_time.day)
+  return 'Monthly on the {}'.format(day) if interval == 1 else 'Every {} months on the {}'.format(interval, day)
+
+def create_series(venue_id, artist_id, frequency, interval, start_times, duration_minutes):
+  # the series and all of its shows in the current transaction, the shows as one
+  # multi-row INSERT. bulk inserts skip the ORM events, so the upcoming show counters are
+  # shifted here. the caller commits
+  series = ShowSeries(venue_id=venue_id, artist_id=artist_id, frequency=frequency, interval=interval,
+                      first_start_time=start_times[0], last_start_time=start_times[-1], count=len(start_times))
+  db.session.add(series)
+  db.session.flush()
+  db.session.execute(insert(Shows.__table__).values([{
+    'venue_id': venue_id,
+    'artist_id': artist_id,
+    'start_time': start_time,
+    'duration_minutes': duration_minutes,
+    'series_id': series.id,
+  } for start_time in start_times]))
+  now = datetime.now()
+  upcoming = sum(1 for start_time in start_times if start_time > now)
+  if upcoming:
+    shift_upcoming_counts(db.session.connection(), venue_id, artist_id, upcoming)
+  return series
+
+def collapse_series(shows):
+  # page data: the shows of a series (in start order) become one entry, the first, with
+  # the number of shows it stands for and the start of the last. other shows pass through
+  collapsed, first_of_series = [], {}
+  for show in shows:
+    series_id = show.pop('series_id')
+    if series_id is None:
+      collapsed.append(show)
+    elif series_id not in first_of_series:
+      show['series'].update(count=1, last_start_time=show['start_time'])
+      first_of_series[series_id] = show
+      collapsed.append(show)
+    else:
+      first = first_of_series[series_id]['series']
+      first.update(count=first['count'] + 1, last_start_time=show['start_time'])
+  return collapsed
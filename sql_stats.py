@@ -0,0 +1,68 @@
+import time
+from collections import Counter
+from flask import g, request, current_app, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL statistics.
+#----------------------------------------------------------------------------#
+
+class QueryStats(object):
+  # statements run while handling one request. the statement text still has its
+  # parameter placeholders, so identical text is the same query shape
+  def __init__(self):
+    self.count = 0
+    self.seconds = 0.0
+    self.shapes = Counter()
+
+  def repeated(self, threshold):
+    return [(statement, n) for statement, n in self.shapes.most_common() if n >= threshold]
+
+def one_line(statement, limit=300):
+  statement = ' '.join(statement.split())
+  return statement if len(statement) <= limit else statement[:limit] + '...'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  # registered once for every engine, the apps that called init_sql_stats get the numbers
+  elapsed = time.perf_counter() - conn.info['query_started'].pop()
+  if not has_app_context() or 'sql_stats' not in current_app.extensions:
+    return
+  if elapsed >= current_app.extensions['sql_stats']['slow_seconds']:
+    current_app.logger.warning('slow query (%.1f ms) in %s: %s', elapsed * 1000,
+                               request.path if has_request_context() else 'no request', one_line(statement))
+  if has_request_context() and 'query_stats' in g:
+    g.query_stats.count += 1
+    g.query_stats.seconds += elapsed
+    g.query_stats.shapes[statement] += 1
+
+def init_sql_stats(app):
+  # counts statements and database time per request, logs statements slower than
+  # SQL_SLOW_QUERY_MS and shapes repeated SQL_REPEAT_THRESHOLD or more times in one
+  # request (likely N+1), and with SQL_STATS_HEADERS adds X-DB-Queries and X-DB-Time (ms)
+  # to responses
+  app.extensions['sql_stats'] = {'slow_seconds': app.config.get('SQL_SLOW_QUERY_MS', 100) / 1000.0}
+  repeat_threshold = app.config.get('SQL_REPEAT_THRESHOLD', 5)
+  headers = app.config.get('SQL_STATS_HEADERS', False)
+
+  @app.before_request
+  def reset_query_stats():
+    # g outlives the request when it reuses an app context pushed by the caller (tests,
+    # benchmarks), so start every request with fresh counts
+    g.query_stats = QueryStats()
+
+  @app.after_request
+  def report_query_stats(response):
+    stats = g.get('query_stats') or QueryStats()
+    for statement, n in stats.repeated(repeat_threshold):
+      app.logger.warning('possible N+1 in %s %s: same query ran %d times: %s',
+                         request.method, request.path, n, one_line(statement))
+    if headers:
+      response.headers['X-DB-Queries'] = str(stats.count)
+      response.headers['X-DB-Time'] = '%.2f' % (stats.seconds * 1000)
+    return response
@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+# the tests drop and recreate the tables of TEST_DATABASE_URL. the testing settings are
+# forced before the app is created, so a shell with SPOTLIGHT_ENV=production exported can
+# not point them at DATABASE_URL
+os.environ['SPOTLIGHT_ENV'] = 'testing'
+
+from app import app
+from models import db
+import asgi
+
+if not app.config['TESTING']:
+  pytest.exit('the app was created without the testing settings, not dropping the tables of {}'.format(
+    app.config['SQLALCHEMY_DATABASE_URI']), returncode=2)
+
+@pytest.fixture
+def database():
+  # empty tables for one test
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+  yield db
+  with app.app_context():
+    db.session.remove()
+    db.drop_all()
+
+@pytest.fixture
+def client(database):
+  return app.test_client()
+
+@pytest.fixture(scope='module')
+def loop():
+  # one event loop for all ASGI requests of the module, the async engines' connections
+  # belong to it
+  loop = asyncio.new_event_loop()
+  yield loop
+  for engine in asgi.engines.values():
+    loop.run_until_complete(engine.dispose())
+  asgi.engines.clear()
+  loop.close()
+
+@pytest.fixture
+def asgi_get(loop):
+  # GETs through the ASGI app, returning the status, headers and body
+  def get(path, headers=None):
+    async def request():
+      async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.asgi_app), base_url='http://localhost') as c:
+        response = await c.get(path, headers=headers or {})
+        return response.status_code, response.headers, response.content
+    return loop.run_until_complete(request())
+  return get
@@ -0,0 +1,135 @@
+import re
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app, detail_cache
+from conditional import code_version
+from models import db, Venue, Artist, Shows
+
+# the pages are requested through the WSGI app and through the ASGI app in asgi.py
+# (asgi_get, see conftest.py)
+
+@pytest.fixture
+def listing(database):
+  # a venue with a past and an upcoming show of one artist, and an artist without shows
+  now = datetime.now()
+  with app.app_context():
+    venue = Venue(name='The Hop', city='San Francisco', state='CA', address='1 Main Street', genres=['Jazz'])
+    artist = Artist(name='Sax Band', city='San Francisco', state='CA', genres=['Jazz'])
+    other = Artist(name='Other Band', city='Austin', state='TX', genres=['Rock n Roll'])
+    db.session.add_all([venue, artist, other])
+    db.session.flush()
+    db.session.add_all([
+      Shows(venue_id=venue.id, artist_id=artist.id, start_time=now - timedelta(days=3)),
+      Shows(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=3)),
+    ])
+    db.session.commit()
+    ids = {'venue': venue.id, 'artist': artist.id, 'other': other.id}
+  ids['pages'] = ['/venues', '/venues/%d' % ids['venue'], '/artists', '/artists/%d' % ids['artist'], '/shows']
+  return ids
+
+@pytest.fixture
+def statements():
+  # the SQL statements run while the test does
+  captured = []
+  def capture(conn, cursor, statement, *args):
+    captured.append(statement)
+  event.listen(Engine, 'before_cursor_execute', capture)
+  yield captured
+  event.remove(Engine, 'before_cursor_execute', capture)
+
+@pytest.fixture
+def wsgi_get(database):
+  client = app.test_client()
+  def get(path, headers=None):
+    response = client.get(path, headers=headers or {})
+    return response.status_code, response.headers, response.data
+  return get
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def get(request, wsgi_get):
+  return wsgi_get if request.param == 'wsgi' else request.getfixturevalue('asgi_get')
+
+def validators(get, paths):
+  return {path: get(path)[1] for path in paths}
+
+def clear_page_cache(ids):
+  detail_cache.delete('venue:%d' % ids['venue'], 'artist:%d' % ids['artist'])
+
+def test_unchanged_page_revalidates_with_one_query(get, listing, statements):
+  for path, headers in validators(get, listing['pages']).items():
+    clear_page_cache(listing)
+    del statements[:]
+    status, _, body = get(path, {'If-None-Match': headers['ETag']})
+    assert (status, body) == (304, b''), path
+    assert len(statements) <= 1, path
+    # the one statement reads the validators, not the page's rows
+    assert not any('"Shows".start_time AS' in s or 'LIMIT' in s for s in statements), path
+    status, _, _ = get(path, {'If-Modified-Since': headers['Last-Modified']})
+    assert status == 304, path
+
+def test_writes_change_the_etags(wsgi_get, asgi_get, listing):
+  venue_path, artist_path = '/venues/%d' % listing['venue'], '/artists/%d' % listing['artist']
+  # Last-Modified has one second resolution
+  time.sleep(1.1)
+  before = validators(wsgi_get, listing['pages'])
+  with app.app_context():
+    Artist.query.get(listing['artist']).name = 'Sax Band Renamed'
+    db.session.commit()
+  after = validators(wsgi_get, listing['pages'])
+  for path in ('/artists', artist_path, venue_path, '/shows'):
+    assert after[path]['ETag'] != before[path]['ETag'], path
+  # the rename skipped the page cache, as a write through another worker would
+  for get in (wsgi_get, asgi_get):
+    _, headers, body = get(venue_path)
+    assert b'Sax Band Renamed' in body
+    assert headers['ETag'] == after[venue_path]['ETag']
+
+  time.sleep(1.1)
+  before = after
+  with app.app_context():
+    db.session.delete(Shows.query.filter(Shows.start_time < datetime.now()).one())
+    db.session.commit()
+  after = validators(wsgi_get, listing['pages'])
+  for path in (venue_path, artist_path, '/shows'):
+    assert after[path]['ETag'] != before[path]['ETag'], path
+    status, _, _ = wsgi_get(path, {'If-Modified-Since': before[path]['Last-Modified']})
+    assert status == 200, path
+
+  before = after
+  with app.app_context():
+    db.session.add(Shows(venue_id=listing['venue'], artist_id=listing['other'], start_time=datetime.now() + timedelta(days=5)))
+    db.session.commit()
+  after = validators(wsgi_get, listing['pages'])
+  for path in (venue_path, '/venues', '/artists', '/shows'):
+    assert after[path]['ETag'] != before[path]['ETag'], path
+
+def test_missing_venue_is_a_404(get, listing):
+  assert get('/venues/999')[0] == 404
+
+def test_flashed_page_is_not_conditional(listing):
+  client = app.test_client()
+  path = '/venues/%d' % listing['venue']
+  etag = client.get(path).headers['ETag']
+  form = client.get('/venues/create').get_data(as_text=True)
+  token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', form).group(1)
+  client.post(path + '/edit', data={
+    'csrf_token': token, 'name': 'The Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main Street',
+    'phone': '4155550123', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/hop',
+    'website_link': 'https://example.com/hop'})
+  response = client.get(path, headers={'If-None-Match': etag})
+  assert response.status_code == 200
+  assert b'successfully updated' in response.data
+  assert 'ETag' not in response.headers
+
+def test_rebuilt_assets_change_the_etags(wsgi_get, listing, monkeypatch):
+  # a deploy that only rebuilds the stylesheets and scripts renames them
+  etag = wsgi_get('/venues')[1]['ETag']
+  monkeypatch.setitem(app.extensions, 'assets',
+                      dict(app.extensions['assets'], files={'css/app.css': 'css/app.0123456789ab.css'}))
+  monkeypatch.setitem(app.extensions, 'conditional', code_version(app))
+  assert wsgi_get('/venues')[1]['ETag'] != etag
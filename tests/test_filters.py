@@ -0,0 +1,24 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app import app, format_datetime
+
+@pytest.fixture
+def new_york(monkeypatch):
+  # the server's local time zone, which the stored start times are in
+  monkeypatch.setenv('TZ', 'America/New_York')
+  time.tzset()
+  yield
+  monkeypatch.undo()
+  time.tzset()
+
+def test_naive_start_times_are_local_time(new_york, monkeypatch):
+  start_time = datetime(2026, 7, 1, 20, 30)
+  monkeypatch.setitem(app.config, 'DISPLAY_TIMEZONE', None)
+  assert format_datetime(start_time) == 'Wed 07, 01, 2026 8:30PM'
+  monkeypatch.setitem(app.config, 'DISPLAY_TIMEZONE', 'America/New_York')
+  assert format_datetime(start_time) == 'Wed 07, 01, 2026 8:30PM'
+  monkeypatch.setitem(app.config, 'DISPLAY_TIMEZONE', 'America/Los_Angeles')
+  assert format_datetime(start_time) == 'Wed 07, 01, 2026 5:30PM'
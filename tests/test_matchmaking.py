@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from app import app
+from matchmaking import CandidateMatrix
+from models import db, Venue, Artist, Shows
+
+def seed_artists(count, genres=('Jazz', 'Blues')):
+  # count artists seeking a venue with the same genres and city, so they all score alike
+  db.session.execute(Artist.__table__.insert(), [
+    dict(name='Artist %d' % n, city='Springfield', state='CA', genres=list(genres), seeking_venue=True)
+    for n in range(count)])
+  db.session.commit()
+
+def test_ties_at_the_limit_go_to_the_lowest_ids(database):
+  with app.app_context():
+    seed_artists(5000)
+    matrix = CandidateMatrix(Artist, Artist.seeking_venue)
+    matrix.ensure_fresh(app)
+    ranked = matrix.rank(['Jazz'], 'Springfield', 'CA', {}, limit=10)
+    ids = [id for id, score, shared, same_location, shows in ranked]
+    assert ids == [id for id, in db.session.query(Artist.id).order_by(Artist.id).limit(10)]
+    # a better score still comes first
+    ranked = matrix.rank(['Jazz', 'Blues'], 'Springfield', 'CA', {ids[-1] + 100: 1}, limit=10)
+    assert [id for id, score, shared, same_location, shows in ranked][:2] == [ids[-1] + 100, ids[0]]
+
+def test_only_ranked_columns_move_the_matching_version(database):
+  with app.app_context():
+    venue = Venue(name='The Hop', city='Springfield', state='CA', address='1 Main Street', genres=['Jazz'],
+                  seeking_talent=True)
+    artist = Artist(name='Sax Band', city='Springfield', state='CA', genres=['Jazz'], seeking_venue=True)
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    matrix = CandidateMatrix(Venue, Venue.seeking_talent)
+    version = matrix.current_version()
+    assert version
+
+    # a booking shifts the counters and updated_at of both rows
+    db.session.add(Shows(venue_id=venue.id, artist_id=artist.id, start_time=datetime.now() + timedelta(days=3)))
+    venue.phone = '4155550123'
+    db.session.commit()
+    assert matrix.current_version() == version
+
+    venue.genres = ['Jazz', 'Blues']
+    db.session.commit()
+    assert matrix.current_version() > version
+    version = matrix.current_version()
+    venue.seeking_talent = False
+    db.session.commit()
+    assert matrix.current_version() > version
+    # outside the matrix, its location does not matter
+    version = matrix.current_version()
+    venue.city = 'Shelbyville'
+    db.session.commit()
+    assert matrix.current_version() == version
@@ -0,0 +1,16 @@
+from prometheus_client import REGISTRY
+
+def requests_total(endpoint, status):
+  return REGISTRY.get_sample_value('spotlight_requests_total', {'method': 'GET', 'endpoint': endpoint, 'status': status}) or 0
+
+def latency_count(endpoint):
+  return REGISTRY.get_sample_value('spotlight_request_duration_seconds_count', {'method': 'GET', 'endpoint': endpoint}) or 0
+
+def test_async_pages_are_measured(database, asgi_get):
+  # the pages asgi.py serves itself skip the Flask hooks that record these
+  before = requests_total('venues', '200'), requests_total('show_venue', '404'), latency_count('venues')
+  assert asgi_get('/venues')[0] == 200
+  assert asgi_get('/venues/999')[0] == 404
+  after = requests_total('venues', '200'), requests_total('show_venue', '404'), latency_count('venues')
+  assert after == (before[0] + 1, before[1] + 1, before[2] + 1)
+  assert REGISTRY.get_sample_value('spotlight_requests_in_progress') == 0
@@ -0,0 +1,58 @@
+import os
+import re
+
+import pytest
+
+from app import app, detail_cache
+from models import db, Venue
+
+# TEST_REPLICA_DATABASE_URL is a second scratch database that does not replicate. both
+# databases get the same venue ids with different names, so each page shows which one
+# served it
+pytestmark = pytest.mark.skipif(not os.environ.get('TEST_REPLICA_DATABASE_URL'),
+                                reason='set TEST_REPLICA_DATABASE_URL to a second scratch database')
+
+VENUE = dict(city='Springfield', state='CA', address='1 Main Street', genres=['Jazz'])
+
+@pytest.fixture
+def replica(database, monkeypatch):
+  # the replica engine, with the routing switched on and both databases seeded
+  monkeypatch.setitem(app.config, 'DB_REPLICA_BINDS', ['replica1'])
+  with app.app_context():
+    replica = db.get_engine(app, bind='replica1')
+    db.Model.metadata.drop_all(replica)
+    db.Model.metadata.create_all(replica)
+    for engine, name in ((db.engine, 'Primary Hall'), (replica, 'Replica Hall')):
+      with engine.begin() as connection:
+        connection.execute(Venue.__table__.insert(), [dict(VENUE, id=1, name=name), dict(VENUE, id=2, name=name + ' 2')])
+  yield replica
+  with app.app_context():
+    db.Model.metadata.drop_all(replica)
+
+def venue_page(client, venue_id=1):
+  detail_cache.delete('venue:%d' % venue_id)
+  return client.get('/venues/%d' % venue_id).get_data(as_text=True)
+
+def test_get_reads_the_replica(replica):
+  assert 'Replica Hall' in venue_page(app.test_client())
+
+def test_writer_reads_its_write(replica):
+  writer, reader = app.test_client(), app.test_client()
+  form = writer.get('/venues/create').get_data(as_text=True)
+  token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', form).group(1)
+  # the redirect shows the flashed message, which names the venue as well
+  writer.post('/venues/1/edit', follow_redirects=True, data=dict(
+    VENUE, csrf_token=token, name='Primary Hall Renamed', phone='4155550123',
+    facebook_link='https://www.facebook.com/hall', website_link='https://example.com/hall'))
+  with app.app_context():
+    assert db.session.query(Venue.name).filter(Venue.id == 1).scalar() == 'Primary Hall Renamed'
+  assert 'Primary Hall Renamed' in venue_page(writer)
+  # everyone else still reads the replica
+  assert 'Replica Hall' in venue_page(reader)
+
+def test_get_delete_runs_on_the_primary(replica):
+  app.test_client().get('/venues/2/delete')
+  with app.app_context():
+    assert db.session.query(Venue.id).filter(Venue.id == 2).scalar() is None
+  with replica.connect() as connection:
+    assert connection.exec_driver_sql('SELECT count(*) FROM "Venue"').scalar() == 2
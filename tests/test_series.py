@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from series import occurrences, describe_series
+
+def days(start_times):
+  return [(start_time.month, start_time.day) for start_time in start_times]
+
+def test_monthly_series_from_the_last_day_stay_on_the_last_day():
+  first = datetime(2031, 1, 31, 20)
+  assert days(occurrences(first, 'monthly', count=4)) == [(1, 31), (2, 28), (3, 31), (4, 30)]
+  assert describe_series('monthly', 1, first) == 'Monthly on the last day'
+  assert days(occurrences(datetime(2031, 4, 30, 20), 'monthly', interval=2, count=3)) == [(4, 30), (6, 30), (8, 31)]
+
+def test_monthly_series_from_the_30th_clamp_in_shorter_months():
+  first = datetime(2031, 1, 30, 20)
+  assert days(occurrences(first, 'monthly', count=4)) == [(1, 30), (2, 28), (3, 30), (4, 30)]
+  assert describe_series('monthly', 1, first) == 'Monthly on the 30th or the last day of shorter months'
+
+def test_monthly_series_keep_their_day_and_time():
+  start_times = occurrences(datetime(2031, 1, 5, 20, 30), 'monthly', until=datetime(2031, 12, 31).date())
+  assert days(start_times) == [(month, 5) for month in range(1, 13)]
+  assert {start_time.time() for start_time in start_times} == {datetime(2031, 1, 5, 20, 30).time()}
+  assert describe_series('monthly', 3, start_times[0]) == 'Every 3 months on the 5th'
@@ -0,0 +1,54 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import app, venue_page_keys, artist_page_keys
+from models import db, Venue, Artist, Shows
+
+# every query the show pages run against Shows has to be able to use an index. the table
+# is small, where Postgres rightly prefers sequential scans, so the plans are made with
+# enable_seqscan = off: a sequential scan is then only left when no index applies
+
+def seed_shows(count):
+  # count shows over a few venues and artists, half of them upcoming, returns the busiest
+  # venue and artist
+  now = datetime.now()
+  venues = [Venue(name='Venue %d' % n, city='Springfield', state='CA', address='%d Main Street' % n, genres=['Jazz'])
+            for n in range(5)]
+  artists = [Artist(name='Artist %d' % n, city='Springfield', state='CA', genres=['Jazz']) for n in range(10)]
+  db.session.add_all(venues + artists)
+  db.session.flush()
+  db.session.add_all([Shows(venue_id=venues[n % len(venues)].id, artist_id=artists[n % len(artists)].id,
+                            start_time=now + timedelta(days=n - count // 2, hours=n % 5)) for n in range(count)])
+  db.session.commit()
+  return venues[0].id, artists[0].id
+
+def test_show_queries_use_an_index(client):
+  with app.app_context():
+    venue_id, artist_id = seed_shows(100)
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+      if statement.lstrip().upper().startswith('SELECT') and '"Shows"' in statement:
+        captured.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+      first = client.get('/shows')
+      # the second page, to plan the keyset condition as well
+      next_page = re.search(r'href="([^"]*after=[^"]*)"', first.get_data(as_text=True))
+      assert next_page
+      client.get(next_page.group(1).replace('&amp;', '&'))
+      client.get('/venues/%d' % venue_id)
+      client.get('/artists/%d' % artist_id)
+      venue_page_keys(venue_id)
+      artist_page_keys(artist_id)
+    finally:
+      event.remove(db.engine, 'before_cursor_execute', capture)
+    assert captured
+
+    connection = db.session.connection()
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    for statement, parameters in captured:
+      plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+      assert not any('Seq Scan on "Shows"' in line for line in plan), '\n'.join([statement] + plan)
+    db.session.rollback()
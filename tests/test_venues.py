@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app import app
+from models import db, Venue, Artist, Shows
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA')]
+
+def seed_venues(count):
+  # count venues spread over a few areas, each with a past and an upcoming show
+  now = datetime.now()
+  artist = Artist(name='Sax Band', city='San Francisco', state='CA', genres=['Jazz'])
+  db.session.add(artist)
+  venues = [Venue(name='Venue %d' % n, city=CITIES[n % len(CITIES)][0], state=CITIES[n % len(CITIES)][1],
+                  address='%d Main Street' % n, genres=['Jazz']) for n in range(count)]
+  db.session.add_all(venues)
+  db.session.flush()
+  db.session.add_all([Shows(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=days))
+                      for venue in venues for days in (-3, 3)])
+  db.session.commit()
+
+def venues_queries(client, count):
+  # the statements /venues runs with count venues in the database
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+    seed_venues(count)
+  response = client.get('/venues')
+  assert response.status_code == 200
+  return int(response.headers['X-DB-Queries'])
+
+def test_venues_query_count_does_not_grow_with_venues(client):
+  # X-DB-Queries comes with the testing settings
+  assert app.config['SQL_STATS_HEADERS']
+  assert venues_queries(client, 10) == venues_queries(client, 100)